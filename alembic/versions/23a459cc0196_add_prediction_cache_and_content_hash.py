@@ -0,0 +1,45 @@
+"""Add prediction cache and MRI image content hash
+
+Revision ID: 23a459cc0196
+Revises: 6f055854a010
+Create Date: 2026-10-16 09:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '23a459cc0196'
+down_revision: Union[str, None] = '6f055854a010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('mri_images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_mri_images_content_hash'), 'mri_images', ['content_hash'], unique=False)
+    op.create_table(
+        'prediction_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('model_version', sa.String(), nullable=False),
+        sa.Column('mri_prob', sa.Float(), nullable=False),
+        sa.Column('predicted_label', sa.String(), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash', 'model_version'),
+    )
+    op.create_index(op.f('ix_prediction_cache_id'), 'prediction_cache', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_prediction_cache_id'), table_name='prediction_cache')
+    op.drop_table('prediction_cache')
+    op.drop_index(op.f('ix_mri_images_content_hash'), table_name='mri_images')
+    op.drop_column('mri_images', 'content_hash')
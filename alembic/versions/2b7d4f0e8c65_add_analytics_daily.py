@@ -0,0 +1,48 @@
+"""Add daily analytics buckets
+
+Revision ID: 2b7d4f0e8c65
+Revises: 9e3f1a6c7b42
+Create Date: 2026-10-16 17:12:09.448617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7d4f0e8c65'
+down_revision: Union[str, None] = '9e3f1a6c7b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'analytics_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('tumor_type', postgresql.ENUM(name='tumortype', create_type=False), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('confidence_sum', sa.Float(), nullable=False),
+        sa.Column('confidence_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('day', 'user_id', 'tumor_type')
+    )
+
+    # Fill the buckets from the existing results
+    op.execute(
+        "INSERT INTO analytics_daily (day, user_id, tumor_type, count, confidence_sum, confidence_count) "
+        "SELECT CAST(created_at AS DATE), user_id, tumor_type, count(*), coalesce(sum(confidence), 0), count(confidence) "
+        "FROM classification_results "
+        "WHERE created_at IS NOT NULL AND user_id IS NOT NULL AND tumor_type IS NOT NULL "
+        "GROUP BY CAST(created_at AS DATE), user_id, tumor_type"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('analytics_daily')
@@ -0,0 +1,53 @@
+"""Add tumor type to classification results
+
+Revision ID: 5c0b8e2f9a17
+Revises: d4a9e7c31f06
+Create Date: 2026-10-16 15:20:48.530112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0b8e2f9a17'
+down_revision: Union[str, None] = 'd4a9e7c31f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+tumortype = postgresql.ENUM('GLIOMA', 'MENINGIOMA', 'NO_TUMOR', 'PITUITARY', name='tumortype')
+
+# Result strings start with the predicted label, e.g. "Glioma (Confidence: 97.10%)"
+RESULT_PREFIXES = {
+    'GLIOMA': 'Glioma',
+    'MENINGIOMA': 'Meningioma',
+    'NO_TUMOR': 'No Tumor',
+    'PITUITARY': 'Pituitary',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tumortype.create(op.get_bind(), checkfirst=True)
+    op.add_column(
+        'classification_results',
+        sa.Column('tumor_type', postgresql.ENUM(name='tumortype', create_type=False), nullable=True),
+    )
+    for tumor_type, prefix in RESULT_PREFIXES.items():
+        op.execute(
+            sa.text(
+                "UPDATE classification_results SET tumor_type = CAST(:tumor_type AS tumortype) "
+                "WHERE tumor_type IS NULL AND result ILIKE :pattern"
+            ).bindparams(tumor_type=tumor_type, pattern=f"{prefix}%")
+        )
+    op.create_index(op.f('ix_classification_results_tumor_type'), 'classification_results', ['tumor_type'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_classification_results_tumor_type'), table_name='classification_results')
+    op.drop_column('classification_results', 'tumor_type')
+    tumortype.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,52 @@
+"""Add keyset pagination indexes to classification_results
+
+Revision ID: 7a3c9d1e5b28
+Revises: 2b7d4f0e8c65
+Create Date: 2026-10-16 18:40:31.207114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3c9d1e5b28'
+down_revision: Union[str, None] = '2b7d4f0e8c65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Results without a timestamp can't be ordered by a keyset cursor, so they are dated
+    # 1970-01-01 (last in the history). Their daily buckets and last uploads are added first.
+    op.execute(
+        "INSERT INTO analytics_daily (day, user_id, tumor_type, count, confidence_sum, confidence_count) "
+        "SELECT DATE '1970-01-01', user_id, tumor_type, count(*), coalesce(sum(confidence), 0), count(confidence) "
+        "FROM classification_results "
+        "WHERE created_at IS NULL AND user_id IS NOT NULL AND tumor_type IS NOT NULL "
+        "GROUP BY user_id, tumor_type "
+        "ON CONFLICT (day, user_id, tumor_type) DO UPDATE SET "
+        "count = analytics_daily.count + excluded.count, "
+        "confidence_sum = analytics_daily.confidence_sum + excluded.confidence_sum, "
+        "confidence_count = analytics_daily.confidence_count + excluded.confidence_count"
+    )
+    op.execute(
+        "UPDATE analytics_user_activity SET last_upload = TIMESTAMP '1970-01-01' "
+        "WHERE last_upload IS NULL "
+        "AND user_id IN (SELECT user_id FROM classification_results WHERE created_at IS NULL)"
+    )
+    op.execute("UPDATE classification_results SET created_at = TIMESTAMP '1970-01-01' WHERE created_at IS NULL")
+    op.alter_column('classification_results', 'created_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index('ix_classification_results_created_at_id', 'classification_results', ['created_at', 'id'], unique=False)
+    op.create_index('ix_classification_results_user_id_created_at_id', 'classification_results', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_classification_results_user_id_created_at_id', table_name='classification_results')
+    op.drop_index('ix_classification_results_created_at_id', table_name='classification_results')
+    op.alter_column('classification_results', 'created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,73 @@
+"""Add analytics rollup tables
+
+Revision ID: 9e3f1a6c7b42
+Revises: 5c0b8e2f9a17
+Create Date: 2026-10-16 16:05:31.702264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3f1a6c7b42'
+down_revision: Union[str, None] = '5c0b8e2f9a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'analytics_totals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('total_predictions', sa.Integer(), nullable=False),
+        sa.Column('positive_predictions', sa.Integer(), nullable=False),
+        sa.Column('negative_predictions', sa.Integer(), nullable=False),
+        sa.Column('confidence_sum', sa.Float(), nullable=False),
+        sa.Column('confidence_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'analytics_tumor_type_counts',
+        sa.Column('tumor_type', postgresql.ENUM(name='tumortype', create_type=False), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('tumor_type')
+    )
+    op.create_table(
+        'analytics_user_activity',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('uploads', sa.Integer(), nullable=False),
+        sa.Column('last_upload', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Fill the rollups from the existing results
+    op.execute(
+        "INSERT INTO analytics_totals "
+        "(id, total_predictions, positive_predictions, negative_predictions, confidence_sum, confidence_count) "
+        "SELECT 1, count(*), count(*) FILTER (WHERE prediction = 'POSITIVE'), "
+        "count(*) FILTER (WHERE prediction = 'NEGATIVE'), coalesce(sum(confidence), 0), count(confidence) "
+        "FROM classification_results"
+    )
+    op.execute(
+        "INSERT INTO analytics_tumor_type_counts (tumor_type, count) "
+        "SELECT tumor_type, count(*) FROM classification_results "
+        "WHERE tumor_type IS NOT NULL GROUP BY tumor_type"
+    )
+    op.execute(
+        "INSERT INTO analytics_user_activity (user_id, uploads, last_upload) "
+        "SELECT user_id, count(*), max(created_at) FROM classification_results "
+        "WHERE user_id IS NOT NULL GROUP BY user_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('analytics_user_activity')
+    op.drop_table('analytics_tumor_type_counts')
+    op.drop_table('analytics_totals')
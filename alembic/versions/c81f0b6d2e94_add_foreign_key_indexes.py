@@ -0,0 +1,34 @@
+"""Index the foreign keys used by lookups and cascading deletes
+
+Revision ID: c81f0b6d2e94
+Revises: 7a3c9d1e5b28
+Create Date: 2026-10-16 21:05:47.318552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f0b6d2e94'
+down_revision: Union[str, None] = '7a3c9d1e5b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_classification_results_mri_image_id'), 'classification_results', ['mri_image_id'], unique=False)
+    op.create_index(op.f('ix_mri_images_user_id'), 'mri_images', ['user_id'], unique=False)
+    op.create_index(op.f('ix_classification_jobs_user_id'), 'classification_jobs', ['user_id'], unique=False)
+    op.create_index('ix_analytics_daily_user_id_day', 'analytics_daily', ['user_id', 'day'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analytics_daily_user_id_day', table_name='analytics_daily')
+    op.drop_index(op.f('ix_classification_jobs_user_id'), table_name='classification_jobs')
+    op.drop_index(op.f('ix_mri_images_user_id'), table_name='mri_images')
+    op.drop_index(op.f('ix_classification_results_mri_image_id'), table_name='classification_results')
@@ -0,0 +1,28 @@
+"""Add model version to classification results
+
+Revision ID: d4a9e7c31f06
+Revises: b7e41c9a2d58
+Create Date: 2026-10-16 13:42:05.114873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9e7c31f06'
+down_revision: Union[str, None] = 'b7e41c9a2d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('classification_results', sa.Column('model_version', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('classification_results', 'model_version')
@@ -0,0 +1,28 @@
+"""Index the content hash of classification jobs
+
+Revision ID: e5d2a8c47f13
+Revises: c81f0b6d2e94
+Create Date: 2026-10-17 10:12:04.526318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5d2a8c47f13'
+down_revision: Union[str, None] = 'c81f0b6d2e94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_classification_jobs_content_hash'), 'classification_jobs', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_classification_jobs_content_hash'), table_name='classification_jobs')
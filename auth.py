@@ -8,15 +8,25 @@ import config
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from models import User
+from utils.executors import BoundedExecutor
+from utils.principal_cache import Principal, principal_cache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# Each bcrypt call costs tens of milliseconds of CPU, so it runs on its own small pool instead of
+# the event loop; bcrypt releases the GIL, so the threads hash in parallel. Started by main.py.
+password_hasher = BoundedExecutor(
+    "password-hashing",
+    max_workers=config.settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=config.settings.PASSWORD_HASH_WORKERS,
+)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_password(plain_password, hashed_password) -> bool:
+    return await password_hasher.run(pwd_context.verify, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=1)):
     to_encode = data.copy()
@@ -37,22 +47,35 @@ def verify_reset_token(token: str):
         print("JWT decode failed:", e)
         return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    """The user the bearer token belongs to.
+
+    FastAPI resolves this once per request, however many dependencies (such
+    as role_guard) need it. Tokens seen recently are answered from the
+    principal cache without decoding them or querying the database; the
+    session is only used on a miss.
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
     try:
         payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
         user_id = int(payload.get("sub"))
         user = await db.get(User, user_id)
         if user is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return user
+        principal = Principal.from_user(user)
+        principal_cache.put(token, principal, payload["exp"])
+        return principal
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-    except (ValueError, TypeError):
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    except (KeyError, ValueError, TypeError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token format")
 
-async def get_admin_user(db: AsyncSession = Depends(get_db)):
+async def get_admin_user(user: Principal = Depends(get_current_user)):
     """Ensure the logged-in user is an admin"""
-    user = await get_current_user(db=db)
     if user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -61,13 +84,12 @@ async def get_admin_user(db: AsyncSession = Depends(get_db)):
     return user
 
 def role_guard(required_roles: List[str]):
-    def check_role(token: str = Depends(oauth2_scheme)):
-        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
-        user_role = payload.get("role")
-        if user_role not in required_roles:
+    # Checks the user's current role rather than the one in the token, so role changes apply to issued tokens
+    def check_role(current_user: Principal = Depends(get_current_user)):
+        if current_user.role not in required_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to access this resource"
             )
-        return token
+        return current_user
     return check_role
@@ -0,0 +1,80 @@
+"""Benchmark the fused validator+classifier cascade against the two-model path.
+
+Both paths run the traced engines from utils.inference_engine over the same
+grayscale batches. The separate path mirrors predict_images() in
+routes/mri_routes.py: RGB expansion in NumPy, a validator pass, then a
+classifier pass over the accepted rows. Uses the models named by the settings
+when they exist, or tiny stand-in models otherwise.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cascade --batch-sizes 1,4,8 --iterations 50
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from config import settings
+from utils.inference_engine import CascadeEngine, InferenceEngine, warmup_batch_sizes
+from utils.model_loading import load_model, resolve_model_path
+from utils.preprocessing import validator_input
+
+
+def load_or_build_models():
+    try:
+        validator = load_model(resolve_model_path(settings.MRI_VALIDATOR_MODEL_PATH, "Validator"))
+        classifier = load_model(resolve_model_path(settings.TUMOR_CLASSIFIER_MODEL_PATH, "Tumor classifier"))
+        return validator, classifier, "trained"
+    except ValueError:
+        from benchmarks.stub_models import build_classifier, build_validator
+        return build_validator(), build_classifier(), "stand-in"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    threshold = settings.MRI_VALIDATOR_THRESHOLD
+
+    validator, classifier, kind = load_or_build_models()
+    warm_sizes = warmup_batch_sizes(max(batch_sizes))
+    validator_engine = InferenceEngine(validator, "validator", warm_sizes)
+    classifier_engine = InferenceEngine(classifier, "classifier", warm_sizes)
+    cascade_engine = CascadeEngine(validator, classifier, batch_sizes=warm_sizes, threshold=threshold)
+    for engine in (validator_engine, classifier_engine, cascade_engine):
+        engine.warmup()
+    channels = validator.input_shape[-1]
+
+    def separate(images):
+        mri_probs = validator_engine.predict(validator_input(images, channels))[:, 0]
+        accepted = np.flatnonzero(mri_probs >= threshold)
+        if len(accepted):
+            classifier_engine.predict(images[accepted])
+
+    def fused(images):
+        cascade_engine.predict(images)
+
+    print(f"{kind} models, {args.iterations} iterations per batch size")
+    rng = np.random.default_rng(0)
+    for size in batch_sizes:
+        images = rng.random((size, 224, 224, 1), dtype=np.float32)
+        timings = {"separate": [], "fused": []}
+        for _ in range(args.iterations):
+            for name, fn in (("separate", separate), ("fused", fused)):
+                started = time.perf_counter()
+                fn(images)
+                timings[name].append((time.perf_counter() - started) * 1000.0)
+        separate_ms = statistics.median(timings["separate"])
+        fused_ms = statistics.median(timings["fused"])
+        print(
+            f"batch {size:>3}: separate {separate_ms:8.3f} ms, fused {fused_ms:8.3f} ms "
+            f"({(separate_ms - fused_ms) / separate_ms:+.0%} saved)"
+        )
+
+
+if __name__ == "__main__":
+    main()
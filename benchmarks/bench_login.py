@@ -0,0 +1,120 @@
+"""Benchmark login throughput, and how much bcrypt stalls the event loop.
+
+Concurrent clients log in through the app in-process (httpx's ASGI
+transport), once with bcrypt called inline on the event loop as login used
+to, then with the password hashing pool at each worker count. A ticker task
+meanwhile sleeps for 5 ms at a time and records how late it wakes up, which
+is how long every other request on the worker would have been held up.
+
+Run from the repository root against a local Postgres, with a user that can
+log in (the admin created by init_db by default):
+
+    python -m benchmarks.bench_login --logins 100 --concurrency 32 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DEPLOYMENT_ROLE", "api")
+
+import httpx
+
+import auth
+import database
+import main
+from routes import auth_routes
+from utils.executors import BoundedExecutor
+
+TICK_SECONDS = 0.005
+
+
+async def verify_inline(plain_password, hashed_password) -> bool:
+    """The old login path: bcrypt on the event loop."""
+    return auth.pwd_context.verify(plain_password, hashed_password)
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - started - TICK_SECONDS) * 1000.0)
+
+
+async def run(client: httpx.AsyncClient, credentials: dict, logins: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = iter(range(logins))
+
+    async def login_client():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.post("/auth/login", json=credentials)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(login_client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    latencies.sort()
+    lags.sort()
+    return {
+        "logins_per_s": logins / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+        "lag_p95_ms": lags[int(len(lags) * 0.95)] if lags else 0.0,
+        "lag_max_ms": lags[-1] if lags else 0.0,
+    }
+
+
+async def bench(args):
+    database.engine.echo = False
+    await main.startup()
+    credentials = {"email": args.email, "password": args.password}
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm the connection pool and passlib's backend
+        (await client.post("/auth/login", json=credentials)).raise_for_status()
+
+        auth_routes.verify_password = verify_inline
+        results["event loop"] = await run(client, credentials, args.logins, args.concurrency)
+        auth_routes.verify_password = auth.verify_password
+
+        for workers in args.workers:
+            auth.password_hasher.shutdown()
+            auth.password_hasher = BoundedExecutor("password-hashing", max_workers=workers, max_concurrency=workers)
+            auth.password_hasher.start()
+            results[f"pool x{workers}"] = await run(client, credentials, args.logins, args.concurrency)
+    await main.shutdown()
+    await database.engine.dispose()
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated hashing pool sizes")
+    parser.add_argument("--email", default="admin@gmail.com")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+    args.workers = [int(workers) for workers in args.workers.split(",")]
+
+    results = asyncio.run(bench(args))
+    print(f"{'mode':>11} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'loop lag p95':>13} {'loop lag max':>13}")
+    for mode, result in results.items():
+        print(
+            f"{mode:>11} {result['logins_per_s']:>9.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+            f"{result['lag_p95_ms']:>10.1f} ms {result['lag_max_ms']:>10.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,112 @@
+"""Micro-benchmark of the per-request preprocessing cost in /mri/upload.
+
+Compares the previous path (write the upload to temp_uploads/ and uploads/,
+re-open the temp file with PIL, build a separate tensor for each model) with
+the single-decode path in utils.preprocessing (one write, decode straight from
+the upload bytes, one float32 array shared by both models).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_preprocessing --iterations 200 --format jpeg
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.preprocessing import decode_mri, validator_input
+
+try:
+    import tensorflow as tf
+except ImportError:  # The legacy path is still measured, minus the tensor conversions
+    tf = None
+
+
+def make_upload(size: int, image_format: str) -> bytes:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def legacy_preprocess(contents: bytes, workdir: str, channels: int):
+    temp_path = os.path.join(workdir, "temp_uploads", "scan")
+    upload_path = os.path.join(workdir, "uploads", "scan")
+    with open(temp_path, "wb") as f:
+        f.write(contents)
+    with open(upload_path, "wb") as f:
+        f.write(contents)
+
+    img = Image.open(temp_path).convert("L").resize((224, 224))
+    img_array = np.array(img) / 255.0
+    validator = np.expand_dims(img_array, axis=(0, -1))
+    classifier = np.expand_dims(img_array, axis=(0, -1))
+    if tf is not None:
+        validator = tf.convert_to_tensor(validator, dtype=tf.float32)
+        if channels == 3:
+            validator = tf.image.grayscale_to_rgb(validator)
+        validator = tf.convert_to_tensor(validator, dtype=tf.float32)
+        classifier = tf.convert_to_tensor(classifier, dtype=tf.float32)
+    elif channels == 3:
+        validator = np.repeat(validator, 3, axis=-1)
+    os.remove(temp_path)
+    return validator, classifier
+
+
+def single_decode_preprocess(contents: bytes, workdir: str, channels: int):
+    upload_path = os.path.join(workdir, "uploads", "scan")
+    with open(upload_path, "wb") as f:
+        f.write(contents)
+
+    image = decode_mri(contents)
+    return validator_input(image, channels), image
+
+
+def measure(fns: dict, contents: bytes, workdir: str, channels: int, iterations: int) -> dict:
+    """Time each path, alternating between them so drift affects both equally."""
+    timings = {name: [] for name in fns}
+    for fn in fns.values():
+        fn(contents, workdir, channels)  # Warm file-system and import caches
+    for _ in range(iterations):
+        for name, fn in fns.items():
+            started = time.perf_counter()
+            fn(contents, workdir, channels)
+            timings[name].append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--size", type=int, default=512, help="Edge length of the synthetic upload")
+    parser.add_argument("--format", default="png", choices=["png", "jpeg"])
+    parser.add_argument("--channels", type=int, default=3, choices=[1, 3], help="Validator input channels")
+    args = parser.parse_args()
+
+    contents = make_upload(args.size, args.format.upper())
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "temp_uploads"))
+        os.makedirs(os.path.join(workdir, "uploads"))
+        results = measure(
+            {"legacy": legacy_preprocess, "single_decode": single_decode_preprocess},
+            contents,
+            workdir,
+            args.channels,
+            args.iterations,
+        )
+
+    print(f"{len(contents)} byte {args.format} upload, {args.iterations} iterations")
+    for name, timings in results.items():
+        print(f"{name:>14}: mean {statistics.mean(timings):.3f} ms, median {statistics.median(timings):.3f} ms")
+    saved = statistics.mean(results["legacy"]) - statistics.mean(results["single_decode"])
+    print(f"{'saved':>14}: {saved:.3f} ms per request ({saved / statistics.mean(results['legacy']):.0%})")
+
+
+if __name__ == "__main__":
+    main()
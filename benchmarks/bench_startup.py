@@ -0,0 +1,87 @@
+"""Benchmark worker startup time and memory for each DEPLOYMENT_ROLE.
+
+Each run starts a fresh interpreter with DEPLOYMENT_ROLE set, imports the
+app and, for roles that serve inference, loads the models through the model
+registry the way the startup hook does. Database setup is left out, since it
+costs the same for every role. Reports the median import and model-load
+times, peak RSS and whether TensorFlow ended up imported. Uses the models
+named by the settings when they exist, or tiny stand-in models otherwise.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROLES = ("api", "inference", "all")
+
+WORKER = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+if main.SERVES_INFERENCE:
+    async def load():
+        await main.start_model_registry()
+        await main.app.state.model_registry.stop()
+    asyncio.run(load())
+loaded = time.perf_counter()
+from benchmarks.compare_backends import peak_rss_mb
+print(json.dumps({
+    "import_s": imported - started,
+    "models_s": loaded - imported,
+    "peak_rss_mb": peak_rss_mb(),
+    "tensorflow": "tensorflow" in sys.modules,
+}))
+"""
+
+
+def model_env(directory: str) -> dict:
+    """Point the settings at stand-in models unless the configured ones exist."""
+    from config import settings
+    from utils.model_loading import resolve_model_path
+
+    try:
+        resolve_model_path(settings.MRI_VALIDATOR_MODEL_PATH, "Validator")
+        resolve_model_path(settings.TUMOR_CLASSIFIER_MODEL_PATH, "Tumor classifier")
+        return {}
+    except ValueError:
+        from benchmarks.stub_models import save_stub_models
+        paths = save_stub_models(directory)
+        print("Using stand-in models")
+        return {"MRI_VALIDATOR_MODEL_PATH": paths["validator"], "TUMOR_CLASSIFIER_MODEL_PATH": paths["classifier"]}
+
+
+def run_role(role: str, env: dict) -> dict:
+    env = {**os.environ, **env, "DEPLOYMENT_ROLE": role, "MODEL_WATCH_INTERVAL": "0", "TF_CPP_MIN_LOG_LEVEL": "2"}
+    completed = subprocess.run([sys.executable, "-c", WORKER], env=env, check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = model_env(directory)
+        print(f"{'role':>10} {'import s':>9} {'models s':>9} {'total s':>8} {'rss MB':>8} {'tensorflow':>11}")
+        for role in ROLES:
+            runs = [run_role(role, env) for _ in range(args.runs)]
+            import_s = statistics.median(run["import_s"] for run in runs)
+            models_s = statistics.median(run["models_s"] for run in runs)
+            rss = statistics.median(run["peak_rss_mb"] for run in runs)
+            print(
+                f"{role:>10} {import_s:>9.2f} {models_s:>9.2f} {import_s + models_s:>8.2f} {rss:>8.0f} "
+                f"{str(runs[0]['tensorflow']):>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
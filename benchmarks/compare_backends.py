@@ -0,0 +1,194 @@
+"""Compare the Keras models against their float16 and int8 TFLite conversions.
+
+Each backend runs in its own subprocess, so the peak RSS it reports belongs to
+that backend alone; "+models" is how much it grew after TensorFlow was
+imported. Every sample image goes through both the validator and the
+classifier one at a time, and the TFLite outputs are compared with the Keras
+ones: validator agreement is whether both sides accept or reject the image,
+top-1 agreement is whether the classifier picks the same class.
+
+Run from the repository root after converting the models:
+
+    python convert_models.py --quantization float16
+    python convert_models.py --quantization int8 --samples path/to/mri_images
+    python -m benchmarks.compare_backends --samples path/to/mri_images
+
+With ``--stand-in`` the tiny models from benchmarks/stub_models.py are built,
+converted and compared instead, so the harness can run without trained models.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ("keras", "float16", "int8")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process.
+
+    ru_maxrss carries over the parent's peak across fork+exec, which is large
+    once the parent has imported TensorFlow, so VmHWM is preferred on Linux.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_backend(backend: str, validator_path: str, classifier_path: str, samples: str, max_samples: int, threshold: float) -> dict:
+    """Body of the worker subprocess: time every sample and return the outputs."""
+    from convert_models import sample_images
+    from utils.inference_engine import InferenceEngine
+    from utils.model_loading import load_model
+    from utils.preprocessing import validator_input
+    from utils.tflite_backend import TFLiteEngine
+
+    # TensorFlow alone accounts for most of the process, so model memory is reported as the growth past this point
+    baseline_rss = peak_rss_mb()
+    if backend == "keras":
+        validator = InferenceEngine(load_model(validator_path), "validator")
+        classifier = InferenceEngine(load_model(classifier_path), "classifier")
+    else:
+        validator = TFLiteEngine(validator_path, "validator")
+        classifier = TFLiteEngine(classifier_path, "classifier")
+    validator.warmup()
+    classifier.warmup()
+    channels = validator.input_shape[-1]
+
+    latencies, mri_probs, labels = [], [], []
+    for image in sample_images(samples, max_samples):
+        batch = image[np.newaxis]
+        started = time.perf_counter()
+        mri_prob = float(validator.predict(validator_input(batch, channels))[0, 0])
+        class_probs = classifier.predict(batch)[0]
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        mri_probs.append(mri_prob)
+        labels.append(int(np.argmax(class_probs)))
+
+    return {
+        "latencies_ms": latencies,
+        "accepted": [prob >= threshold for prob in mri_probs],
+        "labels": labels,
+        "peak_rss_mb": peak_rss_mb(),
+        "model_rss_mb": peak_rss_mb() - baseline_rss,
+        "model_mb": (os.path.getsize(validator_path) + os.path.getsize(classifier_path)) / 1024 / 1024,
+    }
+
+
+def spawn(backend: str, paths: dict, args) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.compare_backends", "--worker", backend,
+        "--validator", paths["validator"], "--classifier", paths["classifier"],
+        "--samples", args.samples, "--max-samples", str(args.max_samples),
+    ]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def stand_in_setup(directory: str) -> tuple:
+    """Build and convert the stand-in models, plus a directory of noise images."""
+    from PIL import Image
+
+    from benchmarks.stub_models import build_classifier, build_validator
+    from utils.preprocessing import decode_mri, validator_input
+    from utils.tflite_backend import convert_model, tflite_path
+
+    samples = os.path.join(directory, "samples")
+    os.makedirs(samples)
+    rng = np.random.default_rng(0)
+    for i in range(32):
+        Image.fromarray(rng.integers(0, 256, (256, 256), dtype=np.uint8)).save(os.path.join(samples, f"{i}.png"))
+    images = [decode_mri(os.path.join(samples, f"{i}.png")) for i in range(32)]
+
+    paths = {"keras": {}, "float16": {}, "int8": {}}
+    for name, model in (("validator", build_validator()), ("classifier", build_classifier())):
+        paths["keras"][name] = os.path.join(directory, f"{name}.keras")
+        model.save(paths["keras"][name])
+        channels = model.input_shape[-1]
+        for quantization in ("float16", "int8"):
+            path = tflite_path(directory, name, quantization)
+            with open(path, "wb") as f:
+                f.write(convert_model(model, quantization, lambda: (validator_input(image, channels) for image in images)))
+            paths[quantization][name] = path
+    return paths, samples
+
+
+def configured_paths() -> dict:
+    from config import settings
+    from utils.model_loading import resolve_model_path
+    from utils.tflite_backend import tflite_path
+
+    paths = {
+        "keras": {
+            "validator": str(resolve_model_path(settings.MRI_VALIDATOR_MODEL_PATH, "Validator")),
+            "classifier": str(resolve_model_path(settings.TUMOR_CLASSIFIER_MODEL_PATH, "Tumor classifier")),
+        }
+    }
+    for quantization in ("float16", "int8"):
+        candidate = {name: tflite_path(settings.TFLITE_MODEL_DIR, name, quantization) for name in ("validator", "classifier")}
+        if all(os.path.exists(path) for path in candidate.values()):
+            paths[quantization] = candidate
+        else:
+            print(f"Skipping {quantization}: run convert_models.py --quantization {quantization} first")
+    return paths
+
+
+def agreement(reference: list, other: list) -> float:
+    return sum(a == b for a, b in zip(reference, other)) / max(1, len(reference))
+
+
+def report(results: dict):
+    keras = results["keras"]
+    print(f"{'backend':>8} {'mean ms':>8} {'p95 ms':>8} {'rss MB':>8} {'+models':>8} {'model MB':>9} {'valid. agr':>10} {'top-1 agr':>10}")
+    for backend, result in results.items():
+        latencies = sorted(result["latencies_ms"])
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(
+            f"{backend:>8} {statistics.mean(latencies):>8.2f} {p95:>8.2f} {result['peak_rss_mb']:>8.0f} {result['model_rss_mb']:>8.0f} "
+            f"{result['model_mb']:>9.2f} {agreement(keras['accepted'], result['accepted']):>10.1%} "
+            f"{agreement(keras['labels'], result['labels']):>10.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Directory of sample MRI images")
+    parser.add_argument("--max-samples", type=int, default=200)
+    parser.add_argument("--stand-in", action="store_true", help="Compare the stand-in models on noise images")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--validator", help=argparse.SUPPRESS)
+    parser.add_argument("--classifier", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        from config import settings
+        result = run_backend(args.worker, args.validator, args.classifier, args.samples, args.max_samples, settings.MRI_VALIDATOR_THRESHOLD)
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.stand_in:
+            paths, args.samples = stand_in_setup(directory)
+        elif not args.samples:
+            parser.error("--samples is required unless --stand-in is given")
+        else:
+            paths = configured_paths()
+        results = {backend: spawn(backend, backend_paths, args) for backend, backend_paths in paths.items()}
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
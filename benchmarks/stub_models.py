@@ -0,0 +1,40 @@
+"""Tiny stand-in Keras models with the same input and output shapes as the real ones.
+
+The validator takes a 224x224 RGB image and returns one sigmoid probability;
+the tumor classifier takes a 224x224 grayscale image and returns a softmax
+over the four tumor classes. They are small enough to build in a second, so
+benchmarks can run without the trained models.
+"""
+import os
+
+import tensorflow as tf
+
+
+def build_validator(channels: int = 3):
+    inputs = tf.keras.Input(shape=(224, 224, channels))
+    x = tf.keras.layers.Conv2D(8, 3, strides=4, activation="relu")(inputs)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    # Biased towards accepting, so most benchmark uploads reach the classifier
+    outputs = tf.keras.layers.Dense(1, activation="sigmoid", bias_initializer=tf.keras.initializers.Constant(3.0))(x)
+    return tf.keras.Model(inputs, outputs, name="stub_validator")
+
+
+def build_classifier(num_classes: int = 4):
+    inputs = tf.keras.Input(shape=(224, 224, 1))
+    x = tf.keras.layers.Conv2D(8, 3, strides=4, activation="relu")(inputs)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs, name="stub_classifier")
+
+
+def save_stub_models(directory: str) -> dict:
+    """Save both stand-in models as .keras files and return their paths without suffix,
+    in the form expected by MRI_VALIDATOR_MODEL_PATH / TUMOR_CLASSIFIER_MODEL_PATH."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        "validator": os.path.join(directory, "brainMri_validator"),
+        "classifier": os.path.join(directory, "brain_tumor_model"),
+    }
+    build_validator().save(paths["validator"] + ".keras")
+    build_classifier().save(paths["classifier"] + ".keras")
+    return paths
@@ -0,0 +1,71 @@
+"""Convert the validator and tumor classifier to quantized TFLite models.
+
+The converted files are written to TFLITE_MODEL_DIR as
+``<validator|classifier>.<quantization>.tflite`` and served when
+INFERENCE_BACKEND=tflite and TFLITE_QUANTIZATION match.
+
+    python convert_models.py --quantization float16
+    python convert_models.py --quantization int8 --samples path/to/mri_images
+"""
+import argparse
+import os
+
+from config import settings
+from utils.model_loading import load_model, resolve_model_path
+from utils.preprocessing import decode_mri, validator_input
+from utils.tflite_backend import QUANTIZATIONS, convert_model, tflite_path
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+
+def sample_images(directory: str, limit: int) -> list:
+    """Decode up to ``limit`` images from ``directory`` for int8 calibration."""
+    images = []
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.lower().endswith(IMAGE_SUFFIXES):
+                images.append(decode_mri(os.path.join(root, filename)))
+                if len(images) >= limit:
+                    return images
+    return images
+
+
+def convert(quantization: str, output_dir: str, samples_dir: str = None, max_samples: int = 200) -> dict:
+    """Convert both models and return the paths they were written to."""
+    models = {
+        "validator": load_model(resolve_model_path(settings.MRI_VALIDATOR_MODEL_PATH, "Validator")),
+        "classifier": load_model(resolve_model_path(settings.TUMOR_CLASSIFIER_MODEL_PATH, "Tumor classifier")),
+    }
+
+    images = []
+    if quantization == "int8":
+        if not samples_dir:
+            raise SystemExit("int8 quantization needs --samples for calibration")
+        images = sample_images(samples_dir, max_samples)
+        if not images:
+            raise SystemExit(f"No images found in {samples_dir}")
+        print(f"Calibrating on {len(images)} images from {samples_dir}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    for name, model in models.items():
+        channels = model.input_shape[-1]
+        representative = lambda: (validator_input(image, channels) for image in images)
+        print(f"Converting {name} model ({quantization})...")
+        content = convert_model(model, quantization, representative if images else None)
+        path = tflite_path(output_dir, name, quantization)
+        with open(path, "wb") as f:
+            f.write(content)
+        print(f"Wrote {path} ({len(content) / 1024 / 1024:.1f} MB)")
+        written[name] = path
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the Keras models to quantized TFLite models.")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=settings.TFLITE_QUANTIZATION)
+    parser.add_argument("--output-dir", default=settings.TFLITE_MODEL_DIR)
+    parser.add_argument("--samples", help="Directory of sample images used to calibrate int8 quantization")
+    parser.add_argument("--max-samples", type=int, default=200)
+    args = parser.parse_args()
+    convert(args.quantization, args.output_dir, args.samples, args.max_samples)
@@ -1,20 +1,72 @@
-from fastapi import FastAPI
-from routes import user_routes, auth_routes, mri_routes, classification_routes
+from fastapi import Depends, FastAPI, Response
+from routes import user_routes, auth_routes, mri_routes, classification_routes, profile_routes
 from fastapi.middleware.cors import CORSMiddleware
-from pathlib import Path
-from database import init_db
+from functools import partial
+import asyncio
+from database import engine, init_db
+import auth
 from config import settings
+from utils.batching import BatchScheduler
+from utils import metrics
+from utils.executors import BoundedExecutor
+from utils.job_queue import JobQueue
+from utils.model_registry import ModelRegistry, ServingModels
+from utils.prediction_cache import prediction_cache
+from utils.principal_cache import principal_cache
+from utils.profiling import ProfilingMiddleware, profile_store
+from utils.reponse import success_response
+from utils.response_cache import response_cache
+from utils.storage import MULTIPART_OVERHEAD, UploadSizeLimitMiddleware
+from utils.model_loading import (
+    init_inference_worker,
+    load_engines,
+    resolve_model_path,
+    resolve_tflite_path,
+    validator_channels,
+    warmup_thread,
+    worker_engine_info,
+    worker_predict,
+)
 import os
 from fastapi.staticfiles import StaticFiles
 
-# Lazy load tensorflow model
-import tensorflow as tf
+# Settings that choose between code paths; a typo would otherwise fall back to the default path
+CHOICES = {
+    "DEPLOYMENT_ROLE": ("api", "inference", "all"),
+    "INFERENCE_MODE": ("separate", "fused"),
+    "INFERENCE_BACKEND": ("keras", "tflite"),
+    "INFERENCE_EXECUTOR": ("thread", "process"),
+    "TFLITE_QUANTIZATION": ("float16", "int8"),
+}
+for name, choices in CHOICES.items():
+    if getattr(settings, name) not in choices:
+        raise ValueError(f"Unknown {name}: {getattr(settings, name)} (expected one of: {', '.join(choices)})")
+# API-only workers never load the models, so they never import TensorFlow
+SERVES_INFERENCE = settings.DEPLOYMENT_ROLE in ("inference", "all")
 
 app = FastAPI()
 
 # Define allowed origins
 origins = settings.cors_origins
 
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/mri/upload": settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+        "/mri/upload-batch": (settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD) * settings.MAX_BATCH_FILES,
+        "/mri/jobs": settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    },
+)
+
+# Inside the metrics middleware, so profiled requests are still timed; off unless configured
+if settings.PROFILE_TOKEN or settings.PROFILE_SAMPLE_RATE > 0:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        token=settings.PROFILE_TOKEN,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,  
@@ -23,53 +75,218 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include Routers
-app.include_router(user_routes.router, prefix="/users", tags=["Users"])
+# Outermost, so requests rejected by the other middleware are timed too
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Include Routers; inference workers only serve the MRI routes
+if settings.DEPLOYMENT_ROLE != "inference":
+    app.include_router(user_routes.router, prefix="/users", tags=["Users"])
 app.include_router(mri_routes.router, prefix="/mri", tags=["MRI"])
-app.include_router(auth_routes.router, prefix="/auth", tags=["Auth"])
-app.include_router(classification_routes.router, prefix="/classification", tags=["Classification"])
+if settings.DEPLOYMENT_ROLE != "inference":
+    app.include_router(auth_routes.router, prefix="/auth", tags=["Auth"])
+    app.include_router(classification_routes.router, prefix="/classification", tags=["Classification"])
+    app.include_router(profile_routes.router, prefix="/profiles", tags=["Profiles"])
 
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 app.mount("/uploads", StaticFiles(directory=UPLOAD_FOLDER), name="uploads")
 
-def load_models():
-    """Loads and stores both MRI validator and tumor classifier models."""
-    if not hasattr(app.state, "brainMri_validator"):
-        validator_path = Path(settings.MRI_VALIDATOR_MODEL_PATH).resolve()
-        if validator_path.with_suffix(".keras").exists():
-            validator_path = validator_path.with_suffix(".keras")
-        elif validator_path.with_suffix(".h5").exists():
-            validator_path = validator_path.with_suffix(".h5")
-        else:
-            raise ValueError(f"Validator model not found: {validator_path}")
-        app.state.brainMri_validator = tf.keras.models.load_model(str(validator_path))
-        print("MRI validator model loaded.")
-
-    if not hasattr(app.state, "brain_tumor_model"):
-        classifier_path = Path(settings.TUMOR_CLASSIFIER_MODEL_PATH).resolve()
-        if classifier_path.with_suffix(".keras").exists():
-            classifier_path = classifier_path.with_suffix(".keras")
-        elif classifier_path.with_suffix(".h5").exists():
-            classifier_path = classifier_path.with_suffix(".h5")
-        else:
-            raise ValueError(f"Tumor classifier model not found: {classifier_path}")
-        app.state.brain_tumor_model = tf.keras.models.load_model(str(classifier_path))
-        print("Tumor classifier model loaded.")
+def model_paths() -> dict:
+    """Files served for each model: the Keras models, or their converted TFLite versions."""
+    if settings.INFERENCE_BACKEND == "tflite":
+        return {
+            name: resolve_tflite_path(settings.TFLITE_MODEL_DIR, name, settings.TFLITE_QUANTIZATION)
+            for name in ("validator", "classifier")
+        }
+    return {
+        "validator": resolve_model_path(settings.MRI_VALIDATOR_MODEL_PATH, "Validator"),
+        "classifier": resolve_model_path(settings.TUMOR_CLASSIFIER_MODEL_PATH, "Tumor classifier"),
+    }
+
+
+async def load_serving_models(paths: dict, version: str) -> ServingModels:
+    """Loads and warms up one model version behind its own inference executor and batchers.
+
+    In "process" mode each worker loads both models once and the API process
+    keeps no copy of its own; in "thread" mode the engines are loaded off the
+    event loop and shared by the executor's threads.
+    """
+    # Imports TensorFlow, so only done once a worker actually loads models
+    from utils.inference_engine import warmup_batch_sizes
+
+    batch_sizes = warmup_batch_sizes(settings.INFERENCE_MAX_BATCH_SIZE)
+    engine_args = (
+        paths,
+        batch_sizes,
+        settings.INFERENCE_MODE,
+        settings.MRI_VALIDATOR_THRESHOLD,
+        settings.INFERENCE_BACKEND,
+        settings.TFLITE_NUM_THREADS,
+    )
+
+    if settings.INFERENCE_EXECUTOR == "process":
+        executor = BoundedExecutor(
+            "inference",
+            kind="process",
+            max_workers=settings.INFERENCE_WORKERS,
+            max_concurrency=settings.INFERENCE_MAX_CONCURRENCY,
+            initializer=init_inference_worker,
+            initargs=engine_args,
+        )
+        executor.start()
+        # Spawn and load every worker now rather than behind the first concurrent requests
+        try:
+            await executor.start_workers()
+            engine_info = await executor.run(worker_engine_info)
+        except Exception:
+            executor.shutdown(wait=False)
+            raise
+        engine_names = engine_info["engines"]
+        channels = engine_info["validator_channels"]
+
+        def make_predict(name):
+            async def predict(batch):
+                return await executor.run(worker_predict, name, batch)
+            return predict
+    else:
+        engines = await asyncio.get_running_loop().run_in_executor(None, partial(load_engines, *engine_args))
+        executor = BoundedExecutor(
+            "inference",
+            kind="thread",
+            max_workers=settings.INFERENCE_WORKERS,
+            max_concurrency=settings.INFERENCE_MAX_CONCURRENCY,
+            initializer=warmup_thread,
+            initargs=(engines,),
+        )
+        executor.start()
+        # Warm every thread's own state now rather than on its first request
+        try:
+            await executor.start_workers()
+        except Exception:
+            executor.shutdown(wait=False)
+            raise
+        engine_names = list(engines)
+        channels = validator_channels(engines)
+
+        def make_predict(name):
+            async def predict(batch):
+                return await executor.run(engines[name].predict, batch)
+            return predict
+
+    predictors = {name: metrics.instrument_model(name, make_predict(name)) for name in engine_names}
+    # One batching scheduler per engine so concurrent uploads share forward passes
+    batchers = {
+        name: BatchScheduler(
+            name,
+            predict,
+            max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+            max_concurrent_batches=settings.INFERENCE_MAX_CONCURRENCY,
+        )
+        for name, predict in predictors.items()
+    }
+    for batcher in batchers.values():
+        await batcher.start()
+
+    print(
+        f"Model version {version} loaded ({settings.INFERENCE_BACKEND} backend, {settings.INFERENCE_MODE} mode, "
+        f"{executor.kind} executor with {executor.max_workers} workers)."
+    )
+    return ServingModels(version, paths, executor, predictors, batchers, channels)
+
+
+async def start_model_registry():
+    """Loads the current models and watches their files for new versions to hot-swap in."""
+    app.state.model_registry = ModelRegistry(
+        model_paths,
+        load_serving_models,
+        watch_interval=settings.MODEL_WATCH_INTERVAL,
+    )
+    await app.state.model_registry.start()
+
+
+async def start_job_queue():
+    """Starts the background workers that drain queued classification jobs.
+
+    Only inference workers run jobs; jobs queued on API-only workers are
+    picked up by them on their next poll of the jobs table.
+    """
+    app.state.job_queue = JobQueue(
+        partial(mri_routes.run_classification_job, app.state),
+        workers=settings.JOB_WORKERS,
+        poll_interval=settings.JOB_POLL_INTERVAL,
+        lease_seconds=settings.JOB_LEASE_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    await app.state.job_queue.start()
+
+
+def register_stats():
+    """Export the stats this worker already keeps alongside the request metrics."""
+    metrics.stats_collector.register("db_pool", lambda: engine.pool.stats())
+    metrics.stats_collector.register("response_cache", response_cache.stats)
+    if settings.DEPLOYMENT_ROLE != "inference":
+        metrics.stats_collector.register("principal_cache", principal_cache.stats)
+        metrics.stats_collector.register("password_hashing", lambda: auth.password_hasher.stats())
+    if SERVES_INFERENCE:
+        metrics.stats_collector.register("prediction_cache", prediction_cache.stats)
+        metrics.stats_collector.register("inference_executor", lambda: app.state.model_registry.current.executor.stats())
+        metrics.stats_collector.register(
+            "inference_batcher",
+            lambda: {name: batcher.stats() for name, batcher in app.state.model_registry.current.batchers.items()},
+            label="model",
+        )
+
+
+if settings.METRICS_ENABLED:
+    register_stats()
 
 
 @app.on_event("startup")
 async def startup():
     # Initialize database (this will create database, tables, and admin user)
     await init_db()
-    load_models() 
-    print("Database initialized successfully.")
+    if settings.DEPLOYMENT_ROLE != "inference":
+        auth.password_hasher.start()
+    if SERVES_INFERENCE:
+        await start_model_registry()
+        await start_job_queue()
+    print(f"Database initialized successfully ({settings.DEPLOYMENT_ROLE} role).")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    auth.password_hasher.shutdown()
+    if not SERVES_INFERENCE:
+        return
+    # Let queued requests finish before the pool goes away
+    await app.state.job_queue.stop()
+    await app.state.model_registry.stop()
+    print("Models unloaded.")
     
 
 @app.get("/predict")
-async def predict():
-    load_models()  # Load model when called
-    return {"message": "Model is ready for predictions."}
+async def predict(registry: ModelRegistry = Depends(mri_routes.get_model_registry)):
+    return {
+        "message": "Model is ready for predictions.",
+        "model_version": registry.current.version,
+    }
+
+
+@app.get("/db/stats", dependencies=[Depends(auth.role_guard(["admin"]))])
+async def database_stats():
+    """This worker's connection pool usage and how long checkouts waited for a connection."""
+    return success_response(engine.pool.stats(), "Database pool stats fetched successfully")
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        """Request, stage and model metrics in the Prometheus text format.
 
-# Access model anywhere via app.state.model
+        Unauthenticated so Prometheus can scrape it; keep it off the public
+        listener at the proxy.
+        """
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Enum, Float, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Date, Enum, Float, Index, Integer, String, ForeignKey, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -10,6 +10,29 @@ class Prediction(enum.Enum):
     POSITIVE = "Positive"
     NEGATIVE = "Negative"
 
+class TumorType(enum.Enum):
+    """Enum representing the tumor class predicted by the classifier."""
+    GLIOMA = "Glioma"
+    MENINGIOMA = "Meningioma"
+    NO_TUMOR = "No Tumor"
+    PITUITARY = "Pituitary"
+
+    @classmethod
+    def from_result(cls, text):
+        """The tumor type a label or result string such as "Glioma (Confidence: 97.10%)" starts with."""
+        if text:
+            for tumor_type in cls:
+                if text.lower().startswith(tumor_type.value.lower()):
+                    return tumor_type
+        return None
+
+class JobStatus(enum.Enum):
+    """Enum representing the lifecycle of an asynchronous classification job."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class User(Base):
     """User model representing application users."""
     __tablename__ = "users"
@@ -22,6 +45,7 @@ class User(Base):
 
     mri_images = relationship("MRIImage", cascade="all, delete-orphan", back_populates="user")
     classification_results = relationship("ClassificationResults", cascade="all, delete-orphan", back_populates="user")
+    classification_jobs = relationship("ClassificationJob", cascade="all, delete-orphan", back_populates="user")
 
 class MRIImage(Base):
     """Model representing MRI image uploads."""
@@ -29,7 +53,8 @@ class MRIImage(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     file_path = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    content_hash = Column(String(64), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     user = relationship("User", back_populates="mri_images")
     classification_results = relationship("ClassificationResults", back_populates="mri_image")
@@ -37,16 +62,104 @@ class MRIImage(Base):
 class ClassificationResults(Base):  
     """Model representing brain tumor classification results."""
     __tablename__ = "classification_results"
+    __table_args__ = (
+        # Keyset pagination of the history, overall and per user, newest first
+        Index("ix_classification_results_created_at_id", "created_at", "id"),
+        Index("ix_classification_results_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    mri_image_id = Column(Integer, ForeignKey("mri_images.id"))
+    mri_image_id = Column(Integer, ForeignKey("mri_images.id"), index=True)
     result = Column(String)
     prediction = Column(Enum(Prediction), default=Prediction.NEGATIVE)
+    tumor_type = Column(Enum(TumorType), index=True)
     confidence = Column(Float)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    model_version = Column(String)  # Content hash of the model files that produced the result
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     user = relationship("User", back_populates="classification_results")
     mri_image = relationship("MRIImage", back_populates="classification_results")
-    
 
+
+class PredictionCacheEntry(Base):
+    """Model output for an image, keyed by image content hash and model version."""
+    __tablename__ = "prediction_cache"
+    __table_args__ = (UniqueConstraint("content_hash", "model_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False)
+    model_version = Column(String, nullable=False)
+    mri_prob = Column(Float, nullable=False)
+    predicted_label = Column(String)  # None when the validator rejected the image
+    confidence = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ClassificationJob(Base):
+    """An upload waiting for, or done with, background classification."""
+    __tablename__ = "classification_jobs"
+    __table_args__ = (Index("ix_classification_jobs_status_created_at", "status", "created_at"),)
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    file_path = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    predicted_label = Column(String)
+    confidence = Column(Float)
+    mri_image_id = Column(Integer)
+    classification_id = Column(Integer)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    user = relationship("User", back_populates="classification_jobs")
+
+
+class AnalyticsTotals(Base):
+    """Running totals over all classification results; a single row with id 1."""
+    __tablename__ = "analytics_totals"
+
+    id = Column(Integer, primary_key=True)
+    total_predictions = Column(Integer, default=0, nullable=False)
+    positive_predictions = Column(Integer, default=0, nullable=False)
+    negative_predictions = Column(Integer, default=0, nullable=False)
+    confidence_sum = Column(Float, default=0.0, nullable=False)
+    confidence_count = Column(Integer, default=0, nullable=False)
+
+
+class AnalyticsTumorTypeCount(Base):
+    """Number of classification results per predicted tumor type."""
+    __tablename__ = "analytics_tumor_type_counts"
+
+    tumor_type = Column(Enum(TumorType), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class AnalyticsUserActivity(Base):
+    """Number of classification results and time of the latest one, per user."""
+    __tablename__ = "analytics_user_activity"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    uploads = Column(Integer, default=0, nullable=False)
+    last_upload = Column(DateTime)
+
+
+class AnalyticsDaily(Base):
+    """Classification results per UTC day, user and tumor type.
+
+    Results without a recognised tumor type are not bucketed.
+    """
+    __tablename__ = "analytics_daily"
+    # Per-user time series, and deleting a user's buckets when the user is deleted
+    __table_args__ = (Index("ix_analytics_daily_user_id_day", "user_id", "day"),)
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tumor_type = Column(Enum(TumorType), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    confidence_sum = Column(Float, default=0.0, nullable=False)
+    confidence_count = Column(Integer, default=0, nullable=False)
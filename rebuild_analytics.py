@@ -0,0 +1,79 @@
+"""Recompute the analytics rollup tables from classification_results.
+
+The rollups are kept up to date as results are created and deleted; this is
+for filling them after bulk changes made outside the API, or for repairing
+them. With --check it only compares the rollups and daily buckets with a
+full aggregation.
+
+    python rebuild_analytics.py
+    python rebuild_analytics.py --check
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import Date, cast, func
+from sqlalchemy.future import select
+
+from database import SessionLocal, engine
+from models import AnalyticsDaily, ClassificationResults
+from utils import analytics
+
+
+async def rebuild():
+    async with SessionLocal() as db:
+        await analytics.rebuild(db)
+        await db.commit()
+    print("Analytics rollups rebuilt.")
+
+
+async def check() -> bool:
+    async with SessionLocal() as db:
+        rollup = dict((await db.execute(analytics.analytics_query())).mappings().one())
+        live = dict((await db.execute(analytics.live_analytics_query())).mappings().one())
+
+    def differs(key):
+        # The rollup averages a running sum, so allow for float rounding
+        if key == "average_confidence" and None not in (rollup[key], live[key]):
+            return abs(rollup[key] - live[key]) > 1e-6
+        return rollup[key] != live[key]
+
+    mismatched = [key for key in live if differs(key)]
+    for key in mismatched:
+        print(f"{key}: rollup {rollup[key]!r}, live {live[key]!r}")
+
+    # Daily buckets, compared on their counts
+    async with SessionLocal() as db:
+        buckets = set(await db.execute(
+            select(AnalyticsDaily.day, AnalyticsDaily.user_id, AnalyticsDaily.tumor_type, AnalyticsDaily.count)
+        ))
+        day = cast(ClassificationResults.created_at, Date)
+        live_buckets = set(await db.execute(
+            select(day, ClassificationResults.user_id, ClassificationResults.tumor_type, func.count())
+            .where(
+                ClassificationResults.created_at.is_not(None),
+                ClassificationResults.user_id.is_not(None),
+                ClassificationResults.tumor_type.is_not(None),
+            )
+            .group_by(day, ClassificationResults.user_id, ClassificationResults.tumor_type)
+        ))
+    if buckets != live_buckets:
+        mismatched.append("daily")
+        print(f"daily buckets: {len(buckets ^ live_buckets)} differ")
+    print("Analytics rollups are out of date." if mismatched else "Analytics rollups match classification_results.")
+    return not mismatched
+
+
+async def main(args):
+    try:
+        if args.check:
+            return 0 if await check() else 1
+        await rebuild()
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the analytics rollup tables.")
+    parser.add_argument("--check", action="store_true", help="Only compare the rollups with a full aggregation")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
@@ -4,10 +4,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from utils.email_utils import send_reset_email
 from models import User
-from auth import create_reset_token, verify_password, create_access_token, verify_reset_token
+from auth import create_reset_token, verify_password, create_access_token, verify_reset_token, password_hasher, role_guard
 from sqlalchemy.future import select
 from pydantic import BaseModel
 from auth import hash_password
+from utils.principal_cache import principal_cache
 from utils.reponse import success_response
 from schemas import ForgotPasswordRequest, ResetPasswordRequest
 
@@ -23,7 +24,7 @@ async def login_user(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == request.email))
     user = result.scalar()
 
-    if not user or not verify_password(request.password, user.password):
+    if not user or not await verify_password(request.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     if not request.email or not request.password:
@@ -62,8 +63,16 @@ async def reset_password(token: str, request: ResetPasswordRequest = Body(...),
 
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar()
-    user.password = hash_password(request.password)
+    user.password = await hash_password(request.password)
     db.add(user)
     await db.commit()
+    principal_cache.invalidate(user.id)
     return {"message": "Password updated successfully"}
 
+@router.get("/stats", dependencies=[Depends(role_guard(["admin"]))])
+async def auth_stats():
+    """Queue and run times of the password hashing pool, and principal cache hit counts."""
+    return success_response(
+        {"password_hashing": password_hasher.stats(), "principal_cache": principal_cache.stats()},
+        "Auth stats fetched successfully",
+    )
@@ -1,24 +1,35 @@
-import re
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from database import get_db
-from models import ClassificationResults, Prediction, User, MRIImage
-from schemas import ClassificationResultSchema, ClassificationResultResponse
-from auth import get_current_user
-from typing import List
-from datetime import datetime
-
-from utils.reponse import success_response
+from config import settings
+from database import SessionLocal, get_db
+from models import ClassificationResults, TumorType, User, MRIImage
+from schemas import ClassificationResultSchema, ClassificationResultResponse, ClassificationResultPage
+from auth import get_current_user, role_guard
+from utils.principal_cache import Principal
+from typing import Optional
+from datetime import date, datetime, timedelta
+from operator import attrgetter
+import csv
+import io
+import json
+
+from utils import analytics
+from utils.pagination import Keyset, PageParams
+from utils.reponse import page_response, success_response
+from utils.response_cache import response_cache
 
 router = APIRouter()
 
+# Newest results first
+results_keyset = Keyset(ClassificationResults.created_at, ClassificationResults.id)
+
 
 @router.post("/save", response_model=ClassificationResultResponse)
 async def save_classification_result(
     result: ClassificationResultSchema,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """Save a new classification result."""
@@ -41,10 +52,14 @@ async def save_classification_result(
             user_id=current_user.id,
             mri_image_id=result.mri_image_id,
             result=result.result,
+            tumor_type=TumorType.from_result(result.result),
         )
 
         db.add(classification_result)
+        await db.flush()
+        await analytics.add_results(db, [classification_result])
         await db.commit()
+        response_cache.invalidate_results(current_user.id)
         await db.refresh(classification_result)
 
         return classification_result
@@ -62,19 +77,22 @@ async def delete_result(classificationId: int, db: AsyncSession = Depends(get_db
         classification = classification.scalar()
         if not classification:
             raise HTTPException(status_code=404, detail="Classification result not found")
+        await analytics.remove_results(db, ClassificationResults.id == classificationId)
         await db.delete(classification)
         await db.commit()
+        response_cache.invalidate_results(classification.user_id)
         return success_response({"classificationId": classificationId}, "Classification result deleted successfully")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete classification result: {str(e)}")    
 
-@router.get("/user/{user_id}", response_model=List[ClassificationResultResponse])
+@router.get("/user/{user_id}", response_model=ClassificationResultPage)
 async def get_user_results(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    page: PageParams = Depends(results_keyset.params),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get all classification results for a specific user."""
+    """Get a page of a specific user's classification results, newest first."""
     # Only admin or the user themselves can view their results
     if current_user.role != "admin" and current_user.id != user_id:
         raise HTTPException(
@@ -85,14 +103,17 @@ async def get_user_results(
     query = select(ClassificationResults).where(
         ClassificationResults.user_id == user_id
     )
-    result = await db.execute(query)
-    return result.scalars().all()
+    result = await db.execute(results_keyset.apply(query, page))
+    items, next_cursor = results_keyset.page(
+        result.scalars().all(), page, lambda row: (row.created_at, row.id)
+    )
+    return page_response(items, next_cursor, "Classification results fetched successfully")
 
 
 @router.get("/image/{mri_image_id}", response_model=ClassificationResultResponse)
 async def get_image_result(
     mri_image_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """Get the classification result for a specific MRI image."""
@@ -128,19 +149,33 @@ async def get_image_result(
 
 
 @router.get("/history")
-async def get_prediction_history(db: AsyncSession = Depends(get_db)):
-    """Get prediction history for the logged-in user."""
+async def get_prediction_history(
+    request: Request,
+    page: PageParams = Depends(results_keyset.params),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get a page of the prediction history, newest first."""
+    return await response_cache.respond(
+        request,
+        ("history", page.cursor, page.limit),
+        settings.HISTORY_CACHE_TTL,
+        lambda: fetch_prediction_history(db, page),
+    )
+
+
+async def fetch_prediction_history(db: AsyncSession, page: PageParams) -> dict:
     try:
         # Query to get classification results with MRI image details
         query = (
             select(ClassificationResults, MRIImage, User)
             .join(MRIImage, ClassificationResults.mri_image_id == MRIImage.id)
             .join(User, ClassificationResults.user_id == User.id)
-            .order_by(ClassificationResults.id.desc())
         )
 
-        result = await db.execute(query)
-        history = result.all()
+        result = await db.execute(results_keyset.apply(query, page))
+        history, next_cursor = results_keyset.page(
+            result.all(), page, lambda row: (row[0].created_at, row[0].id)
+        )
 
         # Format the response
         formatted_history = []
@@ -159,8 +194,8 @@ async def get_prediction_history(db: AsyncSession = Depends(get_db)):
                 }
             )
 
-        return success_response(
-            formatted_history, "Prediction history fetched successfully"
+        return page_response(
+            formatted_history, next_cursor, "Prediction history fetched successfully"
         )
     except Exception as e:
         raise HTTPException(
@@ -169,100 +204,141 @@ async def get_prediction_history(db: AsyncSession = Depends(get_db)):
         )
 
 
-@router.get("/analytics")
-async def get_analytics(db: AsyncSession = Depends(get_db)):
-    """Get analytics for the logged-in user."""
+EXPORT_COLUMNS = (
+    ClassificationResults.id,
+    ClassificationResults.user_id,
+    User.username,
+    ClassificationResults.mri_image_id,
+    MRIImage.file_path,
+    ClassificationResults.result,
+    ClassificationResults.prediction,
+    ClassificationResults.tumor_type,
+    ClassificationResults.confidence,
+    ClassificationResults.model_version,
+    ClassificationResults.created_at,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+# Only these columns need converting before csv or json can write them, so the rest are passed through untouched
+EXPORT_CONVERTERS = [
+    (EXPORT_FIELDS.index("prediction"), attrgetter("value")),
+    (EXPORT_FIELDS.index("tumor_type"), attrgetter("value")),
+    (EXPORT_FIELDS.index("created_at"), datetime.isoformat),
+]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_values(row) -> list:
+    values = list(row)
+    for index, convert in EXPORT_CONVERTERS:
+        if values[index] is not None:
+            values[index] = convert(values[index])
+    return values
+
+
+async def export_rows(format: str, user_id: Optional[int]):
+    """Encode the prediction history one fetched partition at a time.
+
+    Rows are read through a server-side cursor with their own session, since
+    the request's session is closed before a streamed body is sent, so only
+    one partition is held in memory however large the export is.
+    """
+    query = (
+        select(*EXPORT_COLUMNS)
+        .join(MRIImage, ClassificationResults.mri_image_id == MRIImage.id)
+        .join(User, ClassificationResults.user_id == User.id)
+        .order_by(ClassificationResults.created_at, ClassificationResults.id)
+        .execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+    )
+    if user_id is not None:
+        query = query.where(ClassificationResults.user_id == user_id)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(EXPORT_FIELDS)
+    async with SessionLocal() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            if format == "csv":
+                writer.writerows(map(export_values, partition))
+            else:
+                for row in partition:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, export_values(row)))))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+@router.get("/history/export", dependencies=[Depends(role_guard(["admin"]))])
+async def export_prediction_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user_id: Optional[int] = None,
+):
+    """Stream the whole prediction history, oldest first, as NDJSON or CSV."""
+    filename = f"prediction_history_{datetime.utcnow():%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        export_rows(format, user_id),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/analytics/timeseries", dependencies=[Depends(role_guard(["admin"]))])
+async def get_analytics_timeseries(
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Predictions per day, week or month by tumor type and by user, over the last 30 days by default.
+
+    Served from the daily rollup table, so long ranges don't scan
+    classification_results. Dates are UTC and the range is inclusive.
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
     try:
-        userCount = select(func.count()).select_from(User)
-        total_users = await db.execute(userCount)
-        total_users = total_users.scalar_one()
-
-        predictionCount = select(func.count()).select_from(ClassificationResults)
-        total_predictions = await db.execute(predictionCount)
-        total_predictions = total_predictions.scalar_one()
-
-        positive_predictions = (
-            select(func.count())
-            .select_from(ClassificationResults)
-            .where(ClassificationResults.prediction == Prediction.POSITIVE)
+        buckets = await analytics.timeseries(db, interval, start, end, user_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch analytics time series: {str(e)}",
         )
-        positive_predictions = await db.execute(positive_predictions)
-        positive_predictions = positive_predictions.scalar_one()
+    return success_response(
+        {"interval": interval, "start": start.isoformat(), "end": end.isoformat(), "buckets": buckets},
+        "Analytics time series fetched successfully",
+    )
 
-        negative_predictions = (
-            select(func.count())
-            .select_from(ClassificationResults)
-            .where(ClassificationResults.prediction == Prediction.NEGATIVE)
-        )
-        negative_predictions = await db.execute(negative_predictions)
-        negative_predictions = negative_predictions.scalar_one()
-
-        average_confidence = select(
-            func.avg(ClassificationResults.confidence)
-        ).select_from(ClassificationResults)
-        average_confidence = await db.execute(average_confidence)
-        average_confidence = average_confidence.scalar_one()
-
-        result = select(ClassificationResults.result)
-        result = await db.execute(result)
-        results = result.scalars().all()
-
-        def extract_tumor_type(result_str):
-            if result_str:
-                match = re.match(
-                    r"^(Glioma|Meningioma|Pituitary|No Tumor)",
-                    result_str,
-                    re.IGNORECASE,
-                )
-            if match:
-                return match.group(1).lower()  # Return tumor type in lowercase
-            return "unknown"
-
-        # Initialize distribution dictionary
-        prediction_distribution = {
-            "glioma": 0,
-            "meningioma": 0,
-            "pituitary": 0,
-            "no_tumor": 0,
-        }
-        # Count occurrences of each tumor type
-        for result_str in results:
-            tumor_type = extract_tumor_type(result_str)
-            if tumor_type in prediction_distribution:
-                prediction_distribution[tumor_type] += 1
-        # Fetch user activity data (uploads and last upload)
-        user_activity_query = select(
-            ClassificationResults.user_id,
-            func.count(ClassificationResults.user_id).label("uploads"),
-            func.max(ClassificationResults.created_at).label(
-                "last_upload"
-            ),  # Assuming timestamp exists
-        ).group_by(ClassificationResults.user_id)
-
-        user_activity_result = await db.execute(user_activity_query)
-        user_activity = user_activity_result.all()
-        # Format user activity data
-        user_activity_list = []
-        for user_id, uploads, last_upload in user_activity:
-            user_activity_list.append(
-                {
-                    "user_id": user_id,
-                    "uploads": uploads,
-                    "last_upload": last_upload.strftime("%Y-%m-%d %H:%M:%S")
-                    if last_upload
-                    else "N/A",
-                }
-            )
-            # Return the success response with all analytics data
+
+@router.get("/analytics")
+async def get_analytics(request: Request, db: AsyncSession = Depends(get_db)):
+    """Get analytics for the logged-in user."""
+    return await response_cache.respond(
+        request, ("analytics",), settings.ANALYTICS_CACHE_TTL, lambda: fetch_analytics(db)
+    )
+
+
+async def fetch_analytics(db: AsyncSession) -> dict:
+    try:
+        # Read from the rollup tables, so the cost doesn't grow with classification_results
+        row = (await db.execute(analytics.analytics_query())).mappings().one()
         return success_response(
             {
-                "total_users": total_users,
-                "total_predictions": total_predictions,
-                "positive_predictions": positive_predictions,
-                "negative_predictions": negative_predictions,
-                "average_confidence": average_confidence,
-                "prediction_distribution": prediction_distribution,
-                "user_activity": user_activity_list,
+                "total_users": row["total_users"],
+                "total_predictions": row["total_predictions"],
+                "positive_predictions": row["positive_predictions"],
+                "negative_predictions": row["negative_predictions"],
+                "average_confidence": row["average_confidence"],
+                "prediction_distribution": {
+                    tumor_type.name.lower(): row[tumor_type.name.lower()] for tumor_type in TumorType
+                },
+                "user_activity": row["user_activity"],
             },
             "Analytics fetched successfully",
         )
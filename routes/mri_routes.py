@@ -1,110 +1,480 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
-from models import MRIImage, Prediction, User, ClassificationResults
-from auth import get_current_user
-import os
-from PIL import Image
+from database import SessionLocal, get_db
+from models import ClassificationJob, JobStatus, MRIImage, Prediction, TumorType, ClassificationResults
+from auth import get_current_user, role_guard
+from utils.principal_cache import Principal
+from config import settings
+from utils import analytics, metrics
+from utils.reponse import success_response
 import numpy as np
-import tensorflow as tf
+from PIL import Image
+from utils.model_registry import ModelRegistry, ServingModels
+from utils.prediction_cache import CachedPrediction, prediction_cache
+from utils.response_cache import response_cache
+from utils.preprocessing import decode_mri, stack_batch, validator_input
+from utils.storage import discard_stored_file, discard_upload, store_upload
+from typing import List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import json
+import uuid
 
 
 router = APIRouter()
 
+# Class label mapping
+CLASS_LABELS = {0: "Glioma", 1: "Meningioma", 2: "No Tumor", 3: "Pituitary"}
+
+def get_model_registry(request: Request) -> ModelRegistry:
+    """The worker's model registry, or a 503 on API-only workers that don't load the models."""
+    registry = getattr(request.app.state, "model_registry", None)
+    if registry is None:
+        raise HTTPException(
+            status_code=503,
+            detail="This server does not run inference. Submit the scan to /mri/jobs instead.",
+        )
+    return registry
+
+
+def read_image(path: str) -> np.ndarray:
+    """Decode a stored upload, turning unreadable images into a 400."""
+    try:
+        with metrics.stage("decode"):
+            return decode_mri(path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise HTTPException(status_code=400, detail="Could not read the uploaded image.")
+
+
+def to_prediction(mri_prob: float, class_probs: Optional[np.ndarray]) -> CachedPrediction:
+    """Turn raw validator and classifier outputs into a prediction."""
+    if class_probs is None:
+        metrics.record_prediction(None)
+        return CachedPrediction(float(mri_prob))
+    predicted_class_index = int(np.argmax(class_probs))
+    confidence_score = float(np.max(class_probs)) * 100
+    predicted_label = CLASS_LABELS.get(predicted_class_index, "Unknown")
+    metrics.record_prediction(predicted_label)
+    return CachedPrediction(float(mri_prob), predicted_label, confidence_score)
+
+
+def build_records(user_id: int, file_path: str, content_hash: str, prediction: CachedPrediction, model_version: str):
+    """MRIImage and ClassificationResults rows for an accepted prediction.
+
+    The result references the image through the relationship, so both rows are
+    inserted by a single flush without first fetching the image id.
+    """
+    mri_image = MRIImage(
+        file_path=file_path,
+        content_hash=content_hash,
+        user_id=user_id
+    )
+    result = ClassificationResults(
+        user_id=user_id,
+        mri_image=mri_image,
+        result=f"{prediction.predicted_label} (Confidence: {prediction.confidence:.2f}%)",
+        confidence=prediction.confidence,
+        prediction=Prediction.NEGATIVE if prediction.predicted_label == "No Tumor" else Prediction.POSITIVE,
+        tumor_type=TumorType.from_result(prediction.predicted_label),
+        model_version=model_version
+    )
+    return mri_image, result
+
+
+def from_cascade(output: np.ndarray) -> CachedPrediction:
+    """Split a fused cascade output row into validator probability and class distribution."""
+    mri_prob = output[0]
+    return to_prediction(mri_prob, output[1:] if mri_prob >= settings.MRI_VALIDATOR_THRESHOLD else None)
+
+
+async def predict_image(models: ServingModels, path: str) -> CachedPrediction:
+    """Run the validator and, if the image passes, the tumor classifier."""
+    # Decode once; both models share the same float32 array
+    image = read_image(path)
+
+    # Batched with concurrent uploads; each request gets back its own row
+    if "cascade" in models.batchers:
+        with metrics.stage("cascade"):
+            output = await models.batchers["cascade"].submit(image)
+        return from_cascade(output)
+
+    # Step 1: Validate if image is a brain MRI
+    with metrics.stage("validator"):
+        mri_prob = (await models.batchers["validator"].submit(
+            validator_input(image, models.validator_channels)
+        ))[0]
+    if mri_prob < settings.MRI_VALIDATOR_THRESHOLD:
+        return to_prediction(mri_prob, None)
+
+    # Step 2: Classify tumor
+    with metrics.stage("classifier"):
+        class_probs = await models.batchers["classifier"].submit(image)
+    return to_prediction(mri_prob, class_probs)
+
+
+async def predict_images(models: ServingModels, images: np.ndarray) -> List[CachedPrediction]:
+    """Run each model once over a whole batch; only validated images reach the classifier."""
+    if "cascade" in models.predictors:
+        with metrics.stage("cascade"):
+            outputs = await models.predictors["cascade"](images)
+        return [from_cascade(output) for output in outputs]
+
+    with metrics.stage("validator"):
+        mri_probs = (await models.predictors["validator"](
+            validator_input(images, models.validator_channels)
+        ))[:, 0]
+    accepted = np.flatnonzero(mri_probs >= settings.MRI_VALIDATOR_THRESHOLD)
+    class_probs = {}
+    if len(accepted):
+        with metrics.stage("classifier"):
+            class_probs = dict(zip(accepted.tolist(), await models.predictors["classifier"](images[accepted])))
+    return [to_prediction(mri_prob, class_probs.get(i)) for i, mri_prob in enumerate(mri_probs)]
+
+
+async def classify_upload(registry: ModelRegistry, db: AsyncSession, content_hash: str, path: str) -> Tuple[CachedPrediction, str]:
+    """Predict an upload with the current model version, reusing a cached prediction when there is one.
+
+    Returns the prediction and the model version that produced it. The version
+    is pinned for the whole call, so a hot swap in between cannot mix versions.
+    """
+    async with registry.use() as models:
+        # Repeat uploads of the same scan skip inference entirely
+        with metrics.stage("cache_lookup"):
+            prediction = await prediction_cache.get(db, content_hash, models.version)
+        if prediction is None:
+            prediction = await predict_image(models, path)
+            await prediction_cache.put(db, content_hash, models.version, prediction)
+    return prediction, models.version
+
+
 # Upload MRI file, predict, and return prediction + confidence
 @router.post("/upload")
 async def classify_mri(
-    request: Request,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
+    registry: ModelRegistry = Depends(get_model_registry),
 ):
     """Upload MRI image, validate, classify tumor type, and save results."""
     try:
-        # Save the uploaded file temporarily
-        contents = await file.read()
-        temp_path = os.path.join("temp_uploads", file.filename)
-        os.makedirs("temp_uploads", exist_ok=True)
-        with open(temp_path, "wb") as f:
-            f.write(contents)
-
-        # Save permanent copy in uploads directory
-        upload_path = os.path.join("uploads", file.filename)
-        os.makedirs("uploads", exist_ok=True)
-        with open(upload_path, "wb") as f:
-            f.write(contents)
+        # Stream to storage with size and type checks; identical scans are stored once
+        upload = await store_upload(file, settings.UPLOAD_DIR, settings.MAX_FILE_SIZE, settings.ALLOWED_EXTENSIONS)
 
         try:
-            # Load models from app.state
-            mri_validator_model = request.app.state.brainMri_validator
-            tumor_classifier_model = request.app.state.brain_tumor_model
-
-            # Step 1: Validate if image is a brain MRI
-            img = Image.open(temp_path).convert("L").resize((224, 224))
-            img_array = np.array(img) / 255.0
-            validator_input = np.expand_dims(img_array, axis=(0, -1))
-            validator_input = tf.convert_to_tensor(validator_input, dtype=tf.float32)
-
-            # Convert to RGB if validator expects 3 channels
-            if mri_validator_model.input_shape[-1] == 3:
-                validator_input = tf.image.grayscale_to_rgb(validator_input)
-                
-            validator_input_tensor = tf.convert_to_tensor(validator_input, dtype=tf.float32)
-            mri_prob = mri_validator_model.predict(validator_input_tensor)[0][0]
-            if mri_prob < 0.7:
-                os.remove(temp_path)
-                os.remove(upload_path)
-                raise HTTPException(status_code=400, detail="This is not a MRI image. Please upload a valid brain MRI scan.")
+            prediction, model_version = await classify_upload(registry, db, upload.content_hash, upload.path)
 
-            # Step 2: Classify tumor
-            classifier_input = np.expand_dims(img_array, axis=(0, -1))
-            classifier_input = tf.convert_to_tensor(classifier_input, dtype=tf.float32)
-            prediction = tumor_classifier_model.predict(classifier_input)[0]
-            predicted_class_index = int(np.argmax(prediction))
-            confidence_score = float(np.max(prediction)) * 100
-
-            # Class label mapping
-            class_mappings = {0: "Glioma", 1: "Meningioma", 2: "No Tumor", 3: "Pituitary"}
-            predicted_label = class_mappings.get(predicted_class_index, "Unknown")
-
-            # Save MRI image record
-            mri_image = MRIImage(
-                file_path=upload_path,
-                user_id=current_user.id
-            )
-            db.add(mri_image)
-            await db.commit()
-            await db.refresh(mri_image)
-
-            # Save classification result
-            result = ClassificationResults(
-                user_id=current_user.id,
-                mri_image_id=mri_image.id,
-                result=f"{predicted_label} (Confidence: {confidence_score:.2f}%)",
-                confidence=confidence_score,
-                prediction=Prediction.NEGATIVE if predicted_label == "No Tumor" else Prediction.POSITIVE
-            )
-            db.add(result)
-            await db.commit()
-            await db.refresh(result)
+            if prediction.rejected:
+                await db.commit()
+                raise HTTPException(status_code=400, detail="This is not a MRI image. Please upload a valid brain MRI scan.")
 
-            # Cleanup
-            os.remove(temp_path)
+            mri_image, result = build_records(current_user.id, upload.path, upload.content_hash, prediction, model_version)
+            with metrics.stage("db_commit"):
+                db.add_all([mri_image, result])
+                await db.flush()
+                await analytics.add_results(db, [result])
+                await db.commit()
+            response_cache.invalidate_results(current_user.id)
 
             return {
-                "prediction": predicted_label,
-                "confidence": f"{confidence_score:.2f}",
+                "prediction": prediction.predicted_label,
+                "confidence": f"{prediction.confidence:.2f}",
                 "mri_image_id": mri_image.id,
                 "classification_id": result.id
             }
 
+        except HTTPException:
+            await discard_upload(db, upload)
+            raise
         except Exception as e:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if os.path.exists(upload_path):
-                os.remove(upload_path)
+            await db.rollback()
+            await discard_upload(db, upload)
             raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+
+@router.post("/upload-batch")
+async def classify_mri_batch(
+    files: List[UploadFile] = File(...),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    registry: ModelRegistry = Depends(get_model_registry),
+):
+    """Upload many MRI images at once and classify them with one forward pass per model.
+
+    Files that fail the upload checks or the validator are reported per file
+    instead of failing the whole request. All accepted results are saved in a
+    single transaction.
+    """
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MAX_BATCH_FILES} files can be uploaded at once.")
+
+    entries = []
+    uploads = {}
+    for file in files:
+        entry = {"filename": file.filename}
+        entries.append(entry)
+        try:
+            upload = await store_upload(file, settings.UPLOAD_DIR, settings.MAX_FILE_SIZE, settings.ALLOWED_EXTENSIONS)
+        except HTTPException as e:
+            entry.update(status="rejected", detail=e.detail)
+            continue
+        entry["upload"] = upload
+        uploads.setdefault(upload.content_hash, upload)
+
+    try:
+        # The whole batch is predicted by one model version, even across a hot swap
+        async with registry.use() as models:
+            model_version = models.version
+            # Cached scans skip inference; duplicates within the batch are decoded only once
+            with metrics.stage("cache_lookup"):
+                predictions = await prediction_cache.get_many(db, uploads.keys(), model_version)
+            images = {}
+            unreadable = {}
+            for content_hash, upload in uploads.items():
+                if content_hash in predictions:
+                    continue
+                try:
+                    images[content_hash] = read_image(upload.path)
+                except HTTPException as e:
+                    unreadable[content_hash] = e.detail
+
+            if images:
+                new_predictions = dict(zip(images.keys(), await predict_images(models, stack_batch(list(images.values())))))
+                await prediction_cache.put_many(db, new_predictions, model_version)
+                predictions.update(new_predictions)
+
+        records = []
+        for entry in entries:
+            upload = entry.pop("upload", None)
+            if upload is None:
+                continue
+            if upload.content_hash in unreadable:
+                entry.update(status="rejected", detail=unreadable[upload.content_hash])
+                continue
+            prediction = predictions[upload.content_hash]
+            if prediction.rejected:
+                entry.update(status="rejected", detail="This is not a MRI image. Please upload a valid brain MRI scan.")
+            else:
+                records.append((entry, prediction, *build_records(current_user.id, upload.path, upload.content_hash, prediction, model_version)))
+
+        with metrics.stage("db_commit"):
+            db.add_all([row for _, _, mri_image, result in records for row in (mri_image, result)])
+            await db.flush()
+            await analytics.add_results(db, [result for _, _, _, result in records])
+            await db.commit()
+        if records:
+            response_cache.invalidate_results(current_user.id)
+    except Exception as e:
+        await db.rollback()
+        for upload in uploads.values():
+            await discard_upload(db, upload)
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
+    for entry, prediction, mri_image, result in records:
+        entry.update(
+            status="classified",
+            prediction=prediction.predicted_label,
+            confidence=f"{prediction.confidence:.2f}",
+            mri_image_id=mri_image.id,
+            classification_id=result.id,
+        )
+    # Files that were stored but are not referenced by any saved result
+    saved = {mri_image.content_hash for _, _, mri_image, _ in records}
+    for content_hash, upload in uploads.items():
+        if content_hash not in saved:
+            await discard_upload(db, upload)
+
+    return success_response(entries, "Batch classified successfully")
+
+
+def job_response(job: ClassificationJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status.value,
+        "prediction": job.predicted_label,
+        "confidence": f"{job.confidence:.2f}" if job.confidence is not None else None,
+        "mri_image_id": job.mri_image_id,
+        "classification_id": job.classification_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+async def run_classification_job(state, job_id: str, attempt: int):
+    """Classify a queued upload and save its results; used by the background job queue.
+
+    ``attempt`` identifies the queue's claim on the job. Results are only saved
+    while that claim still holds: once its lease expired and the job was
+    claimed again, the newer run owns the job, and this one's work is dropped.
+    """
+    async with SessionLocal() as db:
+        job = await db.get(ClassificationJob, job_id)
+        if job is None:
+            # Deleted along with its user since it was claimed
+            return
+        user_id, content_hash, file_path = job.user_id, job.content_hash, job.file_path
+        claimed = update(ClassificationJob).where(
+            ClassificationJob.id == job_id,
+            ClassificationJob.status == JobStatus.RUNNING,
+            ClassificationJob.attempts == attempt,
+        )
+        try:
+            prediction, model_version = await classify_upload(state.model_registry, db, content_hash, file_path)
+
+            with metrics.stage("db_commit"):
+                if prediction.rejected:
+                    values = {"status": JobStatus.FAILED, "error": "This is not a MRI image. Please upload a valid brain MRI scan."}
+                else:
+                    mri_image, result = build_records(user_id, file_path, content_hash, prediction, model_version)
+                    db.add_all([mri_image, result])
+                    await db.flush()
+                    values = {
+                        "status": JobStatus.COMPLETED,
+                        "predicted_label": prediction.predicted_label,
+                        "confidence": prediction.confidence,
+                        "mri_image_id": mri_image.id,
+                        "classification_id": result.id,
+                    }
+                finished = await db.execute(claimed.values(**values, finished_at=datetime.utcnow()))
+                if not finished.rowcount:
+                    # Rolls back the records flushed above, so the upload is saved only once
+                    await db.rollback()
+                    return
+                if not prediction.rejected:
+                    await analytics.add_results(db, [result])
+                await db.commit()
+            if prediction.rejected:
+                await discard_stored_file(db, content_hash, file_path)
+            else:
+                response_cache.invalidate_results(user_id)
+        except Exception as e:
+            await db.rollback()
+            failed = await db.execute(claimed.values(
+                status=JobStatus.FAILED,
+                error=e.detail if isinstance(e, HTTPException) else f"Prediction failed: {str(e)}",
+                finished_at=datetime.utcnow(),
+            ))
+            await db.commit()
+            if failed.rowcount:
+                # Failed jobs are not retried, so nothing needs the upload any more
+                await discard_stored_file(db, content_hash, file_path)
+
+
+async def get_owned_job(job_id: str, current_user: Principal, db: AsyncSession) -> ClassificationJob:
+    job = await db.get(ClassificationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user.role != "admin" and job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this job")
+    return job
+
+
+@router.post("/jobs", status_code=202)
+async def submit_classification_job(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Store an upload and queue it for background classification, returning a job id immediately."""
+    upload = await store_upload(file, settings.UPLOAD_DIR, settings.MAX_FILE_SIZE, settings.ALLOWED_EXTENSIONS)
+    try:
+        job = ClassificationJob(
+            id=uuid.uuid4().hex,
+            user_id=current_user.id,
+            file_path=upload.path,
+            content_hash=upload.content_hash,
+        )
+        db.add(job)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await discard_upload(db, upload)
+        raise HTTPException(status_code=500, detail=f"Could not queue classification job: {str(e)}")
+
+    # API-only workers have no job queue; an inference worker picks the job up on its next poll
+    job_queue = getattr(request.app.state, "job_queue", None)
+    if job_queue is not None:
+        job_queue.notify()
+    return job_response(job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_classification_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Poll the status, and once finished the result, of a classification job."""
+    return job_response(await get_owned_job(job_id, current_user, db))
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_classification_job(
+    job_id: str,
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Server-sent events for a job: one event per status change, ending once it finishes."""
+    await get_owned_job(job_id, current_user, db)
+    job_queue = getattr(request.app.state, "job_queue", None)
+
+    async def events():
+        last_status = None
+        while not await request.is_disconnected():
+            async with SessionLocal() as session:
+                job = await session.get(ClassificationJob, job_id)
+            if job is None:
+                return
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: {job.status.value}\ndata: {json.dumps(job_response(job))}\n\n"
+                if job.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+                    return
+            # Jobs finished by this process wake us at once; others are seen on the next poll
+            if job_queue is not None:
+                await job_queue.wait_for_update(settings.JOB_POLL_INTERVAL)
+            else:
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/inference/stats", dependencies=[Depends(role_guard(["admin"]))])
+async def inference_stats(registry: ModelRegistry = Depends(get_model_registry)):
+    """Queue depth and batch-size stats of the inference batchers."""
+    models = registry.current
+    return success_response(
+        {
+            "model_version": models.version,
+            "batchers": {name: batcher.stats() for name, batcher in models.batchers.items()},
+            "executor": models.executor.stats(),
+            "prediction_cache": prediction_cache.stats(),
+        },
+        "Inference stats fetched successfully",
+    )
+
+
+@router.get("/models", dependencies=[Depends(role_guard(["admin"]))])
+async def model_versions(registry: ModelRegistry = Depends(get_model_registry)):
+    """The model version being served, versions still finishing requests, and recent versions."""
+    return success_response(registry.stats(), "Model versions fetched successfully")
+
+
+@router.post("/models/reload", dependencies=[Depends(role_guard(["admin"]))])
+async def reload_models(registry: ModelRegistry = Depends(get_model_registry)):
+    """Load the model files on disk now and swap them in if they are a new version."""
+    try:
+        swapped = await registry.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+    message = "New model version loaded" if swapped else "Model files unchanged"
+    return success_response(registry.stats(), message)
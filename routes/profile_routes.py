@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from auth import role_guard
+from utils.profiling import SORT_KEYS, profile_store
+from utils.reponse import success_response
+
+router = APIRouter(dependencies=[Depends(role_guard(["admin"]))])
+
+
+@router.get("")
+async def list_profiles():
+    """Saved request profiles, newest first, with the route, status and duration of each request."""
+    return success_response(profile_store.list(), "Profiles fetched successfully")
+
+
+@router.get("/{profile_id}")
+async def download_profile(profile_id: str):
+    """The raw pstats dump, for pstats, snakeviz or any other cProfile viewer."""
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+@router.get("/{profile_id}/summary", response_class=PlainTextResponse)
+async def profile_summary(
+    profile_id: str,
+    sort: str = Query("cumulative", description=f"One of: {', '.join(SORT_KEYS)}"),
+    limit: int = Query(40, ge=1, le=500),
+):
+    """The top functions of a profile, as pstats prints them."""
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORT_KEYS)}")
+    summary = profile_store.summary(profile_id, sort, limit)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+
+@router.delete("/{profile_id}")
+async def delete_profile(profile_id: str):
+    if profile_store.path(profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    profile_store.delete(profile_id)
+    return success_response(None, "Profile deleted successfully")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import Delete
@@ -6,10 +6,19 @@ from database import get_db
 from models import ClassificationResults, MRIImage, User
 from schemas import UserRegisterSchema
 from auth import get_current_user, hash_password, role_guard
-from utils.reponse import success_response  # Assuming this function hashes passwords
+from utils import analytics
+from config import settings
+from utils.pagination import Keyset, PageParams
+from utils.reponse import page_response, success_response  # Assuming this function hashes passwords
+from utils.principal_cache import Principal, principal_cache
+from utils.response_cache import response_cache
 
 router = APIRouter()
 
+users_keyset = Keyset(User.id, descending=False)
+# Newest results first
+results_keyset = Keyset(ClassificationResults.created_at, ClassificationResults.id)
+
 @router.post("/register")
 async def register_user(request: UserRegisterSchema, db: AsyncSession = Depends(get_db)):
     # Prevent new users from registering as admin
@@ -28,33 +37,44 @@ async def register_user(request: UserRegisterSchema, db: AsyncSession = Depends(
         raise HTTPException(status_code=400, detail="Email already exists")
 
     # Register as a normal user
-    new_user = User(username=request.username, email=request.email, password=hash_password(request.password), role="Normal user")
+    new_user = User(username=request.username, email=request.email, password=await hash_password(request.password), role="Normal user")
     db.add(new_user)
     await db.commit()
+    # total_users in the analytics changed
+    response_cache.invalidate(("analytics",))
     return success_response(new_user, "User registered successfully")
 
 @router.get("/all", dependencies=[Depends(role_guard(["admin"]))])
-async def get_all_users(db: AsyncSession = Depends(get_db),  current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    
-    # Filter out the current user from the list
-    users = [user for user in users if user.id != current_user.id]
-    return success_response(users, "Users fetched successfully")
+async def get_all_users(page: PageParams = Depends(users_keyset.params), db: AsyncSession = Depends(get_db),  current_user: Principal = Depends(get_current_user)):
+    # Leave out the current user
+    query = select(User).where(User.id != current_user.id)
+    result = await db.execute(users_keyset.apply(query, page))
+    users, next_cursor = users_keyset.page(result.scalars().all(), page, lambda user: (user.id,))
+    return page_response(users, next_cursor, "Users fetched successfully")
 
 @router.get("/prediction-history")
-async def get_prediction_history(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_prediction_history(request: Request, page: PageParams = Depends(results_keyset.params), db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return await response_cache.respond(
+        request,
+        ("prediction-history", current_user.id, page.cursor, page.limit),
+        settings.HISTORY_CACHE_TTL,
+        lambda: fetch_prediction_history(db, current_user, page),
+    )
+
+
+async def fetch_prediction_history(db: AsyncSession, current_user: Principal, page: PageParams) -> dict:
     try:
         query = (
             select(ClassificationResults, MRIImage, User)
             .join(MRIImage, ClassificationResults.mri_image_id == MRIImage.id)
             .join(User, ClassificationResults.user_id == User.id)
-            .where(User.id == current_user.id)
-            .order_by(ClassificationResults.id.desc())
+            .where(ClassificationResults.user_id == current_user.id)
         )
         # Execute the query correctly
-        result = await db.execute(query)
-        predictions = result.all()
+        result = await db.execute(results_keyset.apply(query, page))
+        predictions, next_cursor = results_keyset.page(
+            result.all(), page, lambda row: (row[0].created_at, row[0].id)
+        )
         
         results = []
         # Correct tuple unpacking with all three entities
@@ -68,7 +88,7 @@ async def get_prediction_history(db: AsyncSession = Depends(get_db), current_use
                     else None,
                 }
             )
-        return success_response(results, "Prediction history for current user fetched successfully")
+        return page_response(results, next_cursor, "Prediction history for current user fetched successfully")
     except Exception as e:
         print(f"Error in prediction history: {str(e)}")  # Add debugging
         raise HTTPException(
@@ -78,19 +98,25 @@ async def get_prediction_history(db: AsyncSession = Depends(get_db), current_use
     
 @router.delete("/{user_id}", dependencies=[Depends(role_guard(["admin"]))])
 async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    # The admin check may already have loaded the caller on this session, so its
+    # transaction is used rather than starting a new one
     try:
-        # Start transaction
-        async with db.begin():
-            user = await db.execute(select(User).where(User.id == user_id))
-            user = user.scalar()
-            
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            await db.delete(user)
-            await db.commit()   
-            
-            return success_response({"user_id": user_id}, "User deleted successfully")
+        user = await db.execute(select(User).where(User.id == user_id))
+        user = user.scalar()
+
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        await analytics.remove_results(db, ClassificationResults.user_id == user_id)
+        await db.delete(user)
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}")
+
+    response_cache.invalidate_results(user_id)
+    principal_cache.invalidate(user_id)
+    return success_response({"user_id": user_id}, "User deleted successfully")
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
+from typing import List, Optional
 
 class UserRegisterSchema(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -25,10 +26,18 @@ class ClassificationResultResponse(BaseModel):
     user_id: int
     mri_image_id: int
     result: str
+    model_version: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class ClassificationResultPage(BaseModel):
+    # Same envelope as page_response
+    data: List[ClassificationResultResponse]
+    message: str
+    status: str
+    next_cursor: Optional[str] = None
+
 class ForgotPasswordRequest(BaseModel):
     email: EmailStr
     
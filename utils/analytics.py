@@ -0,0 +1,421 @@
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import JSON, Date, cast, delete, func, literal_column, not_, text, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import (
+    AnalyticsDaily,
+    AnalyticsTotals,
+    AnalyticsTumorTypeCount,
+    AnalyticsUserActivity,
+    ClassificationResults,
+    Prediction,
+    TumorType,
+    User,
+)
+
+# The analytics_totals table holds a single row
+TOTALS_ID = 1
+
+
+class Rollup:
+    """Counts for a set of classification results, summed up the same way as the rollup tables."""
+
+    def __init__(self):
+        self.total = 0
+        self.positive = 0
+        self.negative = 0
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+        self.tumor_types = defaultdict(int)
+        self.uploads = defaultdict(int)
+        self.last_upload = {}
+        # (day, user_id, tumor_type) -> [count, confidence_sum, confidence_count]
+        self.daily = defaultdict(lambda: [0, 0.0, 0])
+
+    def add(self, user_id, tumor_type, prediction, created_at, count=1, confidence_sum=0.0, confidence_count=0, day=None):
+        self.total += count
+        if prediction == Prediction.POSITIVE:
+            self.positive += count
+        elif prediction == Prediction.NEGATIVE:
+            self.negative += count
+        self.confidence_sum += confidence_sum
+        self.confidence_count += confidence_count
+        if tumor_type is not None:
+            self.tumor_types[tumor_type] += count
+        self.uploads[user_id] += count
+        if created_at is not None and (self.last_upload.get(user_id) is None or created_at > self.last_upload[user_id]):
+            self.last_upload[user_id] = created_at
+        day = day or (created_at.date() if created_at is not None else None)
+        if None not in (day, user_id, tumor_type):
+            bucket = self.daily[(day, user_id, tumor_type)]
+            bucket[0] += count
+            bucket[1] += confidence_sum
+            bucket[2] += confidence_count
+
+
+async def add_results(db: AsyncSession, results: Iterable[ClassificationResults]):
+    """Add newly created results to the rollups, in the caller's transaction.
+
+    Call after the results have been flushed, so column defaults such as
+    ``created_at`` are filled in.
+    """
+    rollup = Rollup()
+    for result in results:
+        has_confidence = result.confidence is not None
+        rollup.add(
+            result.user_id,
+            result.tumor_type,
+            result.prediction,
+            result.created_at,
+            confidence_sum=result.confidence if has_confidence else 0.0,
+            confidence_count=int(has_confidence),
+        )
+    if not rollup.total:
+        return
+
+    totals = insert(AnalyticsTotals).values(
+        id=TOTALS_ID,
+        total_predictions=rollup.total,
+        positive_predictions=rollup.positive,
+        negative_predictions=rollup.negative,
+        confidence_sum=rollup.confidence_sum,
+        confidence_count=rollup.confidence_count,
+    )
+    await db.execute(totals.on_conflict_do_update(
+        index_elements=[AnalyticsTotals.id],
+        set_={
+            column: getattr(AnalyticsTotals, column) + getattr(totals.excluded, column)
+            for column in ("total_predictions", "positive_predictions", "negative_predictions", "confidence_sum", "confidence_count")
+        },
+    ))
+
+    if rollup.tumor_types:
+        tumor_types = insert(AnalyticsTumorTypeCount).values([
+            {"tumor_type": tumor_type, "count": count} for tumor_type, count in rollup.tumor_types.items()
+        ])
+        await db.execute(tumor_types.on_conflict_do_update(
+            index_elements=[AnalyticsTumorTypeCount.tumor_type],
+            set_={"count": AnalyticsTumorTypeCount.count + tumor_types.excluded.count},
+        ))
+
+    user_rows = [
+        {"user_id": user_id, "uploads": uploads, "last_upload": rollup.last_upload.get(user_id)}
+        for user_id, uploads in rollup.uploads.items()
+        if user_id is not None
+    ]
+    if user_rows:
+        users = insert(AnalyticsUserActivity).values(user_rows)
+        await db.execute(users.on_conflict_do_update(
+            index_elements=[AnalyticsUserActivity.user_id],
+            set_={
+                "uploads": AnalyticsUserActivity.uploads + users.excluded.uploads,
+                "last_upload": func.greatest(AnalyticsUserActivity.last_upload, users.excluded.last_upload),
+            },
+        ))
+
+    if rollup.daily:
+        daily = insert(AnalyticsDaily).values([
+            {
+                "day": day,
+                "user_id": user_id,
+                "tumor_type": tumor_type,
+                "count": count,
+                "confidence_sum": confidence_sum,
+                "confidence_count": confidence_count,
+            }
+            for (day, user_id, tumor_type), (count, confidence_sum, confidence_count) in rollup.daily.items()
+        ])
+        await db.execute(daily.on_conflict_do_update(
+            index_elements=[AnalyticsDaily.day, AnalyticsDaily.user_id, AnalyticsDaily.tumor_type],
+            set_={
+                column: getattr(AnalyticsDaily, column) + getattr(daily.excluded, column)
+                for column in ("count", "confidence_sum", "confidence_count")
+            },
+        ))
+
+
+async def remove_results(db: AsyncSession, condition):
+    """Subtract the results matching ``condition`` from the rollups, in the caller's transaction.
+
+    Call before the results are deleted. A user's last upload time falls back
+    to their latest remaining result.
+    """
+    day = cast(ClassificationResults.created_at, Date)
+    rows = await db.execute(
+        select(
+            ClassificationResults.user_id,
+            ClassificationResults.tumor_type,
+            ClassificationResults.prediction,
+            day,
+            func.count(),
+            func.coalesce(func.sum(ClassificationResults.confidence), 0.0),
+            func.count(ClassificationResults.confidence),
+        )
+        .where(condition)
+        .group_by(ClassificationResults.user_id, ClassificationResults.tumor_type, ClassificationResults.prediction, day)
+    )
+    rollup = Rollup()
+    for user_id, tumor_type, prediction, result_day, count, confidence_sum, confidence_count in rows:
+        rollup.add(user_id, tumor_type, prediction, None, count, confidence_sum, confidence_count, day=result_day)
+    if not rollup.total:
+        return
+
+    await db.execute(
+        update(AnalyticsTotals)
+        .where(AnalyticsTotals.id == TOTALS_ID)
+        .values(
+            total_predictions=AnalyticsTotals.total_predictions - rollup.total,
+            positive_predictions=AnalyticsTotals.positive_predictions - rollup.positive,
+            negative_predictions=AnalyticsTotals.negative_predictions - rollup.negative,
+            confidence_sum=AnalyticsTotals.confidence_sum - rollup.confidence_sum,
+            confidence_count=AnalyticsTotals.confidence_count - rollup.confidence_count,
+        )
+    )
+    for tumor_type, count in rollup.tumor_types.items():
+        await db.execute(
+            update(AnalyticsTumorTypeCount)
+            .where(AnalyticsTumorTypeCount.tumor_type == tumor_type)
+            .values(count=AnalyticsTumorTypeCount.count - count)
+        )
+    for user_id, uploads in rollup.uploads.items():
+        remaining_last_upload = (
+            select(func.max(ClassificationResults.created_at))
+            .where(ClassificationResults.user_id == user_id, not_(condition))
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(AnalyticsUserActivity)
+            .where(AnalyticsUserActivity.user_id == user_id)
+            .values(uploads=AnalyticsUserActivity.uploads - uploads, last_upload=remaining_last_upload)
+        )
+    await db.execute(delete(AnalyticsUserActivity).where(AnalyticsUserActivity.uploads <= 0))
+
+    for (result_day, user_id, tumor_type), (count, confidence_sum, confidence_count) in rollup.daily.items():
+        await db.execute(
+            update(AnalyticsDaily)
+            .where(
+                AnalyticsDaily.day == result_day,
+                AnalyticsDaily.user_id == user_id,
+                AnalyticsDaily.tumor_type == tumor_type,
+            )
+            .values(
+                count=AnalyticsDaily.count - count,
+                confidence_sum=AnalyticsDaily.confidence_sum - confidence_sum,
+                confidence_count=AnalyticsDaily.confidence_count - confidence_count,
+            )
+        )
+    await db.execute(delete(AnalyticsDaily).where(AnalyticsDaily.count <= 0))
+
+
+async def rebuild(db: AsyncSession):
+    """Recompute every rollup from classification_results, in the caller's transaction.
+
+    The rollup tables are locked first, so classifications committed meanwhile
+    wait and are then added on top of the rebuilt counts exactly once.
+    """
+    await db.execute(text(
+        "LOCK TABLE analytics_totals, analytics_tumor_type_counts, analytics_user_activity, analytics_daily "
+        "IN EXCLUSIVE MODE"
+    ))
+    await db.execute(delete(AnalyticsTotals))
+    await db.execute(delete(AnalyticsTumorTypeCount))
+    await db.execute(delete(AnalyticsUserActivity))
+    await db.execute(delete(AnalyticsDaily))
+
+    await db.execute(
+        insert(AnalyticsTotals).from_select(
+            ["id", "total_predictions", "positive_predictions", "negative_predictions", "confidence_sum", "confidence_count"],
+            select(
+                literal_column(str(TOTALS_ID)),
+                func.count(),
+                func.count().filter(ClassificationResults.prediction == Prediction.POSITIVE),
+                func.count().filter(ClassificationResults.prediction == Prediction.NEGATIVE),
+                func.coalesce(func.sum(ClassificationResults.confidence), 0.0),
+                func.count(ClassificationResults.confidence),
+            ),
+        )
+    )
+    await db.execute(
+        insert(AnalyticsTumorTypeCount).from_select(
+            ["tumor_type", "count"],
+            select(ClassificationResults.tumor_type, func.count())
+            .where(ClassificationResults.tumor_type.is_not(None))
+            .group_by(ClassificationResults.tumor_type),
+        )
+    )
+    await db.execute(
+        insert(AnalyticsUserActivity).from_select(
+            ["user_id", "uploads", "last_upload"],
+            select(ClassificationResults.user_id, func.count(), func.max(ClassificationResults.created_at))
+            .where(ClassificationResults.user_id.is_not(None))
+            .group_by(ClassificationResults.user_id),
+        )
+    )
+    day = cast(ClassificationResults.created_at, Date)
+    await db.execute(
+        insert(AnalyticsDaily).from_select(
+            ["day", "user_id", "tumor_type", "count", "confidence_sum", "confidence_count"],
+            select(
+                day,
+                ClassificationResults.user_id,
+                ClassificationResults.tumor_type,
+                func.count(),
+                func.coalesce(func.sum(ClassificationResults.confidence), 0.0),
+                func.count(ClassificationResults.confidence),
+            )
+            .where(
+                ClassificationResults.created_at.is_not(None),
+                ClassificationResults.user_id.is_not(None),
+                ClassificationResults.tumor_type.is_not(None),
+            )
+            .group_by(day, ClassificationResults.user_id, ClassificationResults.tumor_type),
+        )
+    )
+
+
+def timeseries_query(interval: str, start: date, end: date, user_id: Optional[int] = None):
+    """Sums of the daily buckets between ``start`` and ``end`` per period, user and tumor type."""
+    period = cast(func.date_trunc(interval, AnalyticsDaily.day), Date).label("period")
+    query = (
+        select(
+            period,
+            AnalyticsDaily.user_id,
+            AnalyticsDaily.tumor_type,
+            func.sum(AnalyticsDaily.count),
+            func.sum(AnalyticsDaily.confidence_sum),
+            func.sum(AnalyticsDaily.confidence_count),
+        )
+        .where(AnalyticsDaily.day >= start, AnalyticsDaily.day <= end)
+        .group_by(period, AnalyticsDaily.user_id, AnalyticsDaily.tumor_type)
+        .order_by(period)
+    )
+    if user_id is not None:
+        query = query.where(AnalyticsDaily.user_id == user_id)
+    return query
+
+
+async def timeseries(db: AsyncSession, interval: str, start: date, end: date, user_id: Optional[int] = None) -> list:
+    """Results per day, week or month between ``start`` and ``end`` (inclusive), from the daily buckets.
+
+    Weeks start on Monday. Each period lists its total, average confidence and
+    counts by tumor type and by user; periods without results are left out.
+    """
+    query = timeseries_query(interval, start, end, user_id)
+    buckets = {}
+    for period_start, bucket_user_id, tumor_type, count, confidence_sum, confidence_count in await db.execute(query):
+        bucket = buckets.get(period_start)
+        if bucket is None:
+            bucket = buckets[period_start] = {
+                "period": period_start.isoformat(),
+                "total": 0,
+                "confidence_sum": 0.0,
+                "confidence_count": 0,
+                "by_tumor_type": {tumor_type.name.lower(): 0 for tumor_type in TumorType},
+                "by_user": {},
+            }
+        bucket["total"] += count
+        bucket["confidence_sum"] += confidence_sum
+        bucket["confidence_count"] += confidence_count
+        bucket["by_tumor_type"][tumor_type.name.lower()] += count
+        bucket["by_user"][str(bucket_user_id)] = bucket["by_user"].get(str(bucket_user_id), 0) + count
+
+    for bucket in buckets.values():
+        confidence_sum = bucket.pop("confidence_sum")
+        confidence_count = bucket.pop("confidence_count")
+        bucket["average_confidence"] = confidence_sum / confidence_count if confidence_count else None
+    return list(buckets.values())
+
+
+def analytics_query():
+    """The whole analytics payload read from the rollup tables in one statement."""
+    tumor_counts = {
+        tumor_type: select(AnalyticsTumorTypeCount.count)
+        .where(AnalyticsTumorTypeCount.tumor_type == tumor_type)
+        .scalar_subquery()
+        for tumor_type in TumorType
+    }
+    user_activity = select(
+        func.coalesce(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "user_id", AnalyticsUserActivity.user_id,
+                        "uploads", AnalyticsUserActivity.uploads,
+                        "last_upload", func.coalesce(
+                            func.to_char(AnalyticsUserActivity.last_upload, "YYYY-MM-DD HH24:MI:SS"), "N/A"
+                        ),
+                    ),
+                    AnalyticsUserActivity.user_id,
+                )
+            ),
+            literal_column("'[]'::json"),
+            type_=JSON,
+        )
+    ).scalar_subquery()
+
+    totals = select(AnalyticsTotals).where(AnalyticsTotals.id == TOTALS_ID).subquery()
+    return (
+        select(
+            select(func.count()).select_from(User).scalar_subquery().label("total_users"),
+            func.coalesce(totals.c.total_predictions, 0).label("total_predictions"),
+            func.coalesce(totals.c.positive_predictions, 0).label("positive_predictions"),
+            func.coalesce(totals.c.negative_predictions, 0).label("negative_predictions"),
+            (totals.c.confidence_sum / func.nullif(totals.c.confidence_count, 0)).label("average_confidence"),
+            *[func.coalesce(count, 0).label(tumor_type.name.lower()) for tumor_type, count in tumor_counts.items()],
+            user_activity.label("user_activity"),
+        )
+        # Left join, so an empty rollup still returns one row of zeros
+        .select_from(select(literal_column("1")).subquery().outerjoin(totals, literal_column("true")))
+    )
+
+
+def live_analytics_query():
+    """The same payload as analytics_query(), aggregated from classification_results directly.
+
+    Scans the whole table, so it is only used to check the rollups.
+    """
+    activity = (
+        select(
+            ClassificationResults.user_id,
+            func.count(ClassificationResults.user_id).label("uploads"),
+            func.max(ClassificationResults.created_at).label("last_upload"),
+        )
+        .group_by(ClassificationResults.user_id)
+        .subquery()
+    )
+    user_activity = select(
+        func.coalesce(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "user_id", activity.c.user_id,
+                        "uploads", activity.c.uploads,
+                        "last_upload", func.coalesce(
+                            func.to_char(activity.c.last_upload, "YYYY-MM-DD HH24:MI:SS"), "N/A"
+                        ),
+                    ),
+                    activity.c.user_id,
+                )
+            ),
+            literal_column("'[]'::json"),
+            type_=JSON,
+        )
+    ).scalar_subquery()
+
+    return select(
+        select(func.count()).select_from(User).scalar_subquery().label("total_users"),
+        func.count().label("total_predictions"),
+        func.count().filter(ClassificationResults.prediction == Prediction.POSITIVE).label("positive_predictions"),
+        func.count().filter(ClassificationResults.prediction == Prediction.NEGATIVE).label("negative_predictions"),
+        func.avg(ClassificationResults.confidence).label("average_confidence"),
+        *[
+            func.count().filter(ClassificationResults.tumor_type == tumor_type).label(tumor_type.name.lower())
+            for tumor_type in TumorType
+        ],
+        user_activity.label("user_activity"),
+    ).select_from(ClassificationResults)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+
+class BatchScheduler:
+    """Collects single-image inference requests into batched forward passes.
+
+    Requests submitted while a batch is being assembled are grouped until either
+    ``max_batch_size`` rows are waiting or ``max_wait_ms`` has elapsed since the
+    first row arrived. ``predict_fn`` is awaited with the stacked batch and must
+    return one output row per input row, in order. Up to ``max_concurrent_batches``
+    batches may be in flight at once; while they are, new requests keep
+    accumulating into the next batch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        predict_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+    ):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches = set()
+
+        # Stats
+        self.total_batches = 0
+        self.total_items = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.batch_size_histogram = Counter()
+
+    async def start(self):
+        """Start the background task that drains the queue."""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run(), name=f"batcher-{self.name}")
+
+    async def stop(self):
+        """Stop the background task and fail any request still waiting."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"Batch scheduler '{self.name}' stopped"))
+
+    async def submit(self, row: np.ndarray) -> np.ndarray:
+        """Queue a single input row and wait for its own output row."""
+        if self._worker is None:
+            raise RuntimeError(f"Batch scheduler '{self.name}' is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[tuple]:
+        """Wait for the first request, then gather more until the batch is full or the wait expires."""
+        items = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            # Only start collecting once a batch slot is free, so requests that
+            # arrive while every slot is busy end up in a larger next batch
+            await self._slots.acquire()
+            try:
+                items = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            # Drop requests whose caller already went away
+            items = [item for item in items if not item[1].cancelled()]
+            if not items:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._execute(items))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _execute(self, items: List[tuple]):
+        started = time.perf_counter()
+        self._record(len(items), [started - enqueued for _, _, enqueued in items])
+        try:
+            batch = np.stack([row for row, _, _ in items])
+            outputs = await self.predict_fn(batch)
+            for (_, future, _), output in zip(items, outputs):
+                if not future.done():
+                    future.set_result(output)
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _record(self, batch_size: int, waits: List[float]):
+        self.total_batches += 1
+        self.total_items += batch_size
+        self.batch_size_histogram[batch_size] += 1
+        self.total_wait_seconds += sum(waits)
+        self.max_wait_seconds = max(self.max_wait_seconds, max(waits))
+
+    def stats(self) -> dict:
+        """Queue depth and batch-size statistics for tuning batch size against latency."""
+        return {
+            "name": self.name,
+            "running": self._worker is not None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches_in_flight": len(self._batches),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "mean_batch_size": self.total_items / self.total_batches if self.total_batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_size_histogram.items())},
+            "mean_queue_wait_ms": self.total_wait_seconds / self.total_items * 1000.0 if self.total_items else 0.0,
+            "max_queue_wait_ms": self.max_wait_seconds * 1000.0,
+        }
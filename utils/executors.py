@@ -0,0 +1,146 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class BoundedExecutor:
+    """Runs blocking callables off the event loop with a cap on concurrent calls.
+
+    ``kind`` selects a thread pool or a process pool. Process workers are started
+    with the ``spawn`` method so that libraries like TensorFlow are initialised
+    fresh in each worker, and ``initializer`` runs once per worker (e.g. to load
+    models). Callers beyond ``max_concurrency`` wait on a semaphore instead of
+    piling work into the pool's unbounded internal queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str = "thread",
+        max_workers: int = 1,
+        max_concurrency: Optional[int] = None,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_concurrency = max(1, max_concurrency or self.max_workers)
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # Stats
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def start(self):
+        """Create the underlying pool. Safe to call more than once."""
+        if self._executor is not None:
+            return
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self.name,
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def start_workers(self):
+        """Start every worker of the pool now, so ``initializer`` runs before the first call.
+
+        Both kinds of pool otherwise start workers as calls arrive, and each new
+        worker's initializer would delay the call that started it. Every worker
+        is held at a barrier until all have started, so each gets one task;
+        process workers share the barrier through a manager process that only
+        lives for the duration of this call.
+        """
+        loop = asyncio.get_running_loop()
+        manager = None
+        if self.kind == "process":
+            manager = await asyncio.to_thread(multiprocessing.get_context("spawn").Manager)
+            barrier = manager.Barrier(self.max_workers)
+        else:
+            barrier = threading.Barrier(self.max_workers)
+        try:
+            await asyncio.gather(*(loop.run_in_executor(self._executor, barrier.wait) for _ in range(self.max_workers)))
+        except Exception:
+            # A failed initializer leaves the other workers waiting for it
+            barrier.abort()
+            raise
+        finally:
+            if manager is not None:
+                manager.shutdown()
+
+    def shutdown(self, wait: bool = True):
+        """Shut the pool down, waiting for running calls when ``wait`` is set."""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+        self._semaphore = None
+
+    async def run(self, fn: Callable, *args):
+        """Run ``fn(*args)`` in the pool and return its result."""
+        if self._executor is None:
+            raise RuntimeError(f"Executor '{self.name}' is not running")
+
+        enqueued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started = time.perf_counter()
+        queue_seconds = started - enqueued
+        self.total_queue_seconds += queue_seconds
+        self.max_queue_seconds = max(self.max_queue_seconds, queue_seconds)
+        self.in_flight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_run_seconds += time.perf_counter() - started
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "running": self._executor is not None,
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "mean_queue_ms": self.total_queue_seconds / finished * 1000.0 if finished else 0.0,
+            "max_queue_ms": self.max_queue_seconds * 1000.0,
+            "mean_run_ms": self.total_run_seconds / finished * 1000.0 if finished else 0.0,
+        }
@@ -0,0 +1,132 @@
+import logging
+import time
+from typing import Iterable, List
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_batch_sizes(max_batch_size: int) -> List[int]:
+    """Powers of two up to ``max_batch_size``, plus ``max_batch_size`` itself."""
+    sizes = []
+    size = 1
+    while size < max_batch_size:
+        sizes.append(size)
+        size *= 2
+    sizes.append(max(1, max_batch_size))
+    return sizes
+
+
+class BatchedEngine:
+    """Pads batches up to a fixed set of warmed batch sizes and runs them through ``_run``.
+
+    Backends implement ``_run``, which takes a batch of exactly one of
+    ``batch_sizes`` rows and returns its outputs as an array they no longer
+    use, so every shape a backend sees at runtime has been run during warmup.
+    """
+
+    backend = ""
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def warmup(self) -> dict:
+        """Run the model once per batch size, logging the timings."""
+        timings = {}
+        for size in self.batch_sizes:
+            started = time.perf_counter()
+            self._run(np.zeros((size, *self.input_shape[1:]), dtype=np.float32))
+            timings[size] = (time.perf_counter() - started) * 1000.0
+            logger.info("Warmed up %s %s model for batch size %d in %.1f ms", self.name, self.backend, size, timings[size])
+        return timings
+
+    def warmup_thread(self):
+        """Warm whatever the calling thread owns; nothing unless the backend keeps per-thread state."""
+
+    def _bucket(self, size: int) -> int:
+        for bucket in self.batch_sizes:
+            if bucket >= size:
+                return bucket
+        return self.batch_sizes[-1]
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Run ``batch`` through the model and return one output row per input row."""
+        batch = np.asarray(batch, dtype=np.float32)
+        outputs = []
+        # Batches larger than the biggest warmed size are split into chunks
+        for offset in range(0, len(batch), self.batch_sizes[-1]):
+            chunk = batch[offset:offset + self.batch_sizes[-1]]
+            padding = self._bucket(len(chunk)) - len(chunk)
+            if padding:
+                chunk = np.concatenate([chunk, np.zeros((padding, *chunk.shape[1:]), dtype=np.float32)])
+            outputs.append(self._run(chunk)[:len(chunk) - padding])
+        return np.concatenate(outputs)
+
+
+class InferenceEngine(BatchedEngine):
+    """Serves a Keras model through a traced graph function instead of ``Model.predict``.
+
+    ``Model.predict`` builds a tf.data pipeline and callbacks on every call. Here
+    the forward pass is traced once against a fixed input signature, and
+    incoming batches are zero-padded up to the nearest warmed batch size so that
+    every shape the graph sees at runtime has already been run during warmup.
+    The traced graph is shared by every thread.
+    """
+
+    backend = "keras"
+
+    def __init__(self, model, name: str, batch_sizes: Iterable[int] = (1,)):
+        self.model = model
+        self.name = name
+        self.input_shape = tuple(model.input_shape)
+        self.batch_sizes = sorted(set(batch_sizes))
+        self._forward = tf.function(
+            self._call,
+            input_signature=[tf.TensorSpec(shape=(None, *self.input_shape[1:]), dtype=tf.float32)],
+        )
+
+    def _call(self, inputs):
+        return self.model(inputs, training=False)
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self._forward(tf.convert_to_tensor(batch)).numpy()
+
+
+class CascadeEngine(InferenceEngine):
+    """Runs the MRI validator and the tumor classifier as one traced graph.
+
+    Takes the grayscale batch both models share and returns, per image, the
+    validator probability followed by the class distribution. Images the
+    validator rejects are gathered out before the classifier runs, and their
+    class distribution is returned as zeros.
+    """
+
+    def __init__(self, validator, classifier, name: str = "cascade", batch_sizes: Iterable[int] = (1,), threshold: float = 0.7):
+        self.validator = validator
+        self.classifier = classifier
+        self.threshold = threshold
+        self.validator_channels = validator.input_shape[-1]
+        self.num_classes = classifier.output_shape[-1]
+        # The classifier's grayscale input is the cascade's input
+        super().__init__(classifier, name, batch_sizes)
+
+    def _call(self, images):
+        validator_images = tf.image.grayscale_to_rgb(images) if self.validator_channels == 3 else images
+        mri_prob = self.validator(validator_images, training=False)[:, 0]
+
+        # Early rejection: only images that pass the validator reach the classifier
+        accepted = tf.where(mri_prob >= self.threshold)[:, 0]
+        output_shape = tf.stack([tf.shape(images, out_type=tf.int64)[0], self.num_classes])
+        class_probs = tf.cond(
+            tf.size(accepted) > 0,
+            lambda: tf.scatter_nd(
+                accepted[:, None],
+                self.classifier(tf.gather(images, accepted), training=False),
+                output_shape,
+            ),
+            # Some kernels reject empty batches, so an all-rejected batch skips the classifier
+            lambda: tf.zeros(output_shape, dtype=tf.float32),
+        )
+        return tf.concat([mri_prob[:, None], class_probs], axis=1)
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+from database import SessionLocal
+from models import ClassificationJob, JobStatus
+from utils.storage import discard_stored_file
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Drains the persistent ``classification_jobs`` table with a pool of worker tasks.
+
+    Workers claim the oldest queued job with ``FOR UPDATE SKIP LOCKED``, so any
+    number of processes can share the table without running a job twice. Jobs
+    enqueued by this process wake a worker immediately; jobs from other
+    processes are picked up on the next poll. Every process checks for
+    expired leases several times per lease period, so a job left running by a
+    crashed worker is requeued soon after its lease expires. ``run_job`` gets
+    the job id and the attempt number of the claim it runs under, so a run
+    that outlived its lease can tell that the job was claimed again.
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[str, int], Awaitable[None]],
+        workers: int = 2,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+    ):
+        self.run_job = run_job
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._updated = asyncio.Event()
+
+    async def start(self):
+        await self.requeue_stale()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._reap(), name="job-reaper"))
+
+    async def stop(self):
+        """Stop the workers. A job cut off mid-run is requeued after its lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake an idle worker after a job was enqueued."""
+        self._wakeup.set()
+
+    def publish(self):
+        """Wake everyone waiting in wait_for_update() after a job changed state."""
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def wait_for_update(self, timeout: float):
+        """Wait until a job in this process changes state, or ``timeout`` seconds pass."""
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def requeue_stale(self) -> int:
+        """Requeue jobs whose worker died mid-run, failing those out of attempts; returns how many were requeued."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        stale = (ClassificationJob.status == JobStatus.RUNNING) & (ClassificationJob.started_at < cutoff)
+        async with SessionLocal() as session:
+            failed = (await session.execute(
+                update(ClassificationJob)
+                .where(stale, ClassificationJob.attempts >= self.max_attempts)
+                .values(status=JobStatus.FAILED, error="Job did not finish", finished_at=datetime.utcnow())
+                .returning(ClassificationJob.content_hash, ClassificationJob.file_path)
+            )).all()
+            result = await session.execute(
+                update(ClassificationJob).where(stale).values(status=JobStatus.QUEUED)
+            )
+            await session.commit()
+            for content_hash, file_path in failed:
+                await discard_stored_file(session, content_hash, file_path)
+        if result.rowcount:
+            logger.info("Requeued %d stale classification jobs", result.rowcount)
+        if failed:
+            logger.info("Failed %d stale classification jobs out of attempts", len(failed))
+        return result.rowcount
+
+    async def _reap(self):
+        # Concurrent reapers in other processes are harmless: each UPDATE re-checks
+        # the job's status once it holds the row lock
+        interval = max(self.poll_interval, self.lease_seconds / 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await self.requeue_stale():
+                    self.notify()
+            except Exception as e:
+                logger.error(f"Failed to requeue stale classification jobs: {str(e)}")
+
+    async def _claim(self) -> Optional[Tuple[str, int]]:
+        """Claim the oldest queued job, returning its id and the attempt number that identifies this claim."""
+        next_job = (
+            select(ClassificationJob.id)
+            .where(ClassificationJob.status == JobStatus.QUEUED)
+            .order_by(ClassificationJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with SessionLocal() as session:
+            result = await session.execute(
+                update(ClassificationJob)
+                .where(ClassificationJob.id == next_job)
+                .values(
+                    status=JobStatus.RUNNING,
+                    started_at=datetime.utcnow(),
+                    attempts=ClassificationJob.attempts + 1,
+                )
+                .returning(ClassificationJob.id, ClassificationJob.attempts)
+            )
+            claim = result.one_or_none()
+            await session.commit()
+        return tuple(claim) if claim else None
+
+    async def _work(self):
+        while True:
+            # Cleared before claiming, so a job enqueued after an empty claim still wakes us
+            self._wakeup.clear()
+            try:
+                claim = await self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim classification job: {str(e)}")
+                claim = None
+
+            if claim is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, attempt = claim
+            try:
+                await self.run_job(job_id, attempt)
+            except Exception as e:
+                logger.error(f"Classification job {job_id} crashed: {str(e)}")
+            finally:
+                self.publish()
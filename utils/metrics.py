@@ -0,0 +1,183 @@
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Seconds; finer than the client's defaults at the low end, where most stages fall
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Stages of a classification request, in the order they run
+STAGES = ("upload_read", "disk_write", "decode", "cache_lookup", "validator", "classifier", "cascade", "db_commit")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "classification_stage_duration_seconds",
+    "Time spent in each stage of classifying an upload",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_DURATION = Histogram(
+    "model_inference_duration_seconds",
+    "Time of one forward pass, including the wait for an inference executor slot",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_BATCH_SIZE = Histogram(
+    "model_batch_size",
+    "Images per forward pass",
+    ["model"],
+    buckets=BATCH_SIZE_BUCKETS,
+)
+VALIDATOR_REJECTIONS = Counter(
+    "validator_rejections_total",
+    "Images the validator rejected as not being brain MRI scans",
+)
+PREDICTIONS = Counter(
+    "predictions_total",
+    "Images classified, by predicted class",
+    ["label"],
+)
+
+# Children are bound once so the hot paths skip the label lookup
+_stages = {name: STAGE_DURATION.labels(name) for name in STAGES}
+
+
+def stage(name: str):
+    """Context manager timing one stage of a classification request."""
+    return _stages[name].time()
+
+
+def observe_stage(name: str, seconds: float):
+    """Record a stage timed by the caller, for stages spread over a loop."""
+    _stages[name].observe(seconds)
+
+
+def record_prediction(label: Optional[str]):
+    """Count a freshly inferred prediction; cached repeats are not model work and are not counted."""
+    if label is None:
+        VALIDATOR_REJECTIONS.inc()
+    else:
+        PREDICTIONS.labels(label).inc()
+
+
+def instrument_model(name: str, predict: Callable[[np.ndarray], Awaitable[np.ndarray]]):
+    """Wrap a model's predict function to record its batch sizes and forward pass times.
+
+    Every forward pass of the model goes through the wrapped function, whether
+    its batch was assembled by a BatchScheduler or sent whole by a batch upload.
+    """
+    batch_sizes = MODEL_BATCH_SIZE.labels(name)
+    durations = MODEL_DURATION.labels(name)
+
+    async def instrumented(batch: np.ndarray) -> np.ndarray:
+        batch_sizes.observe(len(batch))
+        with durations.time():
+            return await predict(batch)
+
+    return instrumented
+
+
+class StatsCollector:
+    """Exports the stats() of the pools, caches and executors as gauges, read at scrape time.
+
+    Sources are registered under a metric name prefix; every numeric stat
+    becomes a ``<prefix>_<key>`` gauge. A source registered with a ``label``
+    returns a dict of stats dicts keyed by that label's values instead. Sources
+    that fail, e.g. before the models are loaded, are skipped.
+    """
+
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, prefix: str, stats: Callable[[], dict], label: Optional[str] = None):
+        self._sources[prefix] = (stats, label)
+
+    def describe(self):
+        # Sources are registered after the collector, so there is nothing to check names against
+        return []
+
+    def collect(self):
+        families = {}
+        for prefix, (stats, label) in self._sources.items():
+            try:
+                groups = stats() if label else {None: stats()}
+            except Exception as e:
+                logger.debug(f"Skipping {prefix} stats: {str(e)}")
+                continue
+            for label_value, values in groups.items():
+                for key, value in values.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    name = f"{prefix}_{key}"
+                    family = families.get(name)
+                    if family is None:
+                        family = families[name] = GaugeMetricFamily(
+                            name, f"{key} from the {prefix} stats", labels=[label] if label else None
+                        )
+                    family.add_metric([str(label_value)] if label else [], float(value))
+        yield from families.values()
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render() -> bytes:
+    """The Prometheus text exposition of this worker's metrics.
+
+    Metrics live in each worker process. When PROMETHEUS_MULTIPROC_DIR is set
+    (it must be before the app is imported), the histograms and counters of
+    every worker are merged instead; the stats gauges are per process and are
+    then left out.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+class MetricsMiddleware:
+    """Records the duration of every HTTP request by method, route template and status.
+
+    Routes are labelled with their path template (``/mri/jobs/{job_id}``), so
+    the number of series stays bounded; requests that match no route, such as
+    404s, static files and requests rejected by an outer middleware, share the
+    ``other`` label. Streaming responses are timed until their last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope it was given
+            route = getattr(scope.get("route"), "path", "other")
+            REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+# TensorFlow and the engine modules are imported inside the functions that load
+# models, so API-only workers can import this module without paying for them
+
+
+def resolve_model_path(path: str, label: str) -> Path:
+    """Find the saved model for ``path``, preferring the .keras format over .h5."""
+    model_path = Path(path).resolve()
+    if model_path.with_suffix(".keras").exists():
+        return model_path.with_suffix(".keras")
+    if model_path.with_suffix(".h5").exists():
+        return model_path.with_suffix(".h5")
+    raise ValueError(f"{label} model not found: {model_path}")
+
+
+def resolve_tflite_path(model_dir: str, name: str, quantization: str) -> Path:
+    """Find a model converted by convert_models.py."""
+    from utils.tflite_backend import tflite_path
+
+    path = Path(tflite_path(model_dir, name, quantization)).resolve()
+    if not path.exists():
+        raise ValueError(f"TFLite model not found: {path}. Run convert_models.py first.")
+    return path
+
+
+def model_version(paths) -> str:
+    """Short content hash identifying the exact model files being served."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_model(path: Path):
+    import tensorflow as tf
+
+    return tf.keras.models.load_model(str(path))
+
+
+def load_engines(
+    model_paths: dict,
+    batch_sizes,
+    mode: str = "separate",
+    threshold: float = 0.7,
+    backend: str = "keras",
+    num_threads: Optional[int] = None,
+) -> dict:
+    """Load both models and wrap them in warmed-up inference engines.
+
+    In "separate" mode the validator and classifier are served as two engines;
+    in "fused" mode they are combined into a single "cascade" engine. With the
+    "tflite" backend ``model_paths`` point at converted .tflite files, which are
+    only served in "separate" mode.
+    """
+    from utils.inference_engine import CascadeEngine, InferenceEngine
+    from utils.tflite_backend import TFLiteEngine
+
+    if backend == "tflite":
+        if mode == "fused":
+            raise ValueError("The fused cascade is only available with the keras backend")
+        engines = {
+            name: TFLiteEngine(str(path), name, batch_sizes, num_threads)
+            for name, path in model_paths.items()
+        }
+        for engine in engines.values():
+            engine.warmup()
+        return engines
+
+    validator = load_model(model_paths["validator"])
+    classifier = load_model(model_paths["classifier"])
+    if mode == "fused":
+        engines = {"cascade": CascadeEngine(validator, classifier, batch_sizes=batch_sizes, threshold=threshold)}
+    else:
+        engines = {
+            "validator": InferenceEngine(validator, "validator", batch_sizes),
+            "classifier": InferenceEngine(classifier, "classifier", batch_sizes),
+        }
+    for engine in engines.values():
+        engine.warmup()
+    return engines
+
+
+def warmup_thread(engines: dict):
+    """Thread-pool initializer: warm the per-thread state, like TFLite interpreters, of every engine."""
+    for engine in engines.values():
+        engine.warmup_thread()
+
+
+def validator_channels(engines: dict) -> int:
+    """Number of input channels the validator was trained on."""
+    if "cascade" in engines:
+        return engines["cascade"].validator_channels
+    return engines["validator"].input_shape[-1]
+
+
+# Engines owned by a process-pool worker, loaded once by init_inference_worker
+_worker_engines = {}
+
+
+def init_inference_worker(model_paths: dict, batch_sizes, mode: str, threshold: float, backend: str, num_threads: Optional[int]):
+    """Process-pool initializer: load and warm up every model once per worker process."""
+    # Spawned workers start with no logging config, so warmup timings would be lost
+    logging.basicConfig(level=logging.INFO)
+    _worker_engines.update(load_engines(model_paths, batch_sizes, mode, threshold, backend, num_threads))
+
+
+def worker_predict(name: str, batch):
+    """Run a batch through one of this worker's engines."""
+    return _worker_engines[name].predict(batch)
+
+
+def worker_engine_info() -> dict:
+    return {"engines": list(_worker_engines), "validator_channels": validator_channels(_worker_engines)}
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils.batching import BatchScheduler
+from utils.executors import BoundedExecutor
+from utils.model_loading import model_version
+
+logger = logging.getLogger(__name__)
+
+
+class ServingModels:
+    """One loaded model version with its own executor, predict functions and batchers.
+
+    Requests hold it through ModelRegistry.use(), so a request that started on
+    this version finishes on it even if a newer version is swapped in meanwhile.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        paths: dict,
+        executor: BoundedExecutor,
+        predictors: Dict[str, Callable],
+        batchers: Dict[str, BatchScheduler],
+        validator_channels: int,
+    ):
+        self.version = version
+        self.paths = paths
+        self.executor = executor
+        # Unbatched entry points for callers that already hold a whole batch
+        self.predictors = predictors
+        self.batchers = batchers
+        self.validator_channels = validator_channels
+        self.loaded_at = datetime.utcnow()
+        self.retired_at: Optional[datetime] = None
+        self.active = 0
+        self._closed = False
+
+    async def close(self):
+        """Stop the batchers and shut the executor down once nothing uses this version."""
+        if self._closed:
+            return
+        self._closed = True
+        for batcher in self.batchers.values():
+            await batcher.stop()
+        # Process workers can take a moment to exit, so don't block the event loop on them
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown, True)
+        # Drop the engines so the registry history doesn't keep old models in memory
+        self.predictors = {}
+        self.batchers = {}
+        logger.info("Model version %s unloaded", self.version)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "paths": {name: str(path) for name, path in self.paths.items()},
+            "loaded_at": self.loaded_at.isoformat(),
+            "retired_at": self.retired_at.isoformat() if self.retired_at else None,
+            "active_requests": self.active,
+        }
+
+
+class ModelRegistry:
+    """Tracks the model files on disk and hot-swaps new versions in without a restart.
+
+    A version is identified by the content hash of the model files returned by
+    ``resolve_paths``. When the files change, the new version is loaded and
+    warmed up by ``load`` while the current one keeps serving, then swapped in
+    at once. The old version is unloaded after the last request using it
+    finishes. Every ``watch_interval`` seconds the files' size and mtime are
+    checked for changes (0 disables the watcher; reload() can still be called).
+
+    New model files should be moved into place with a rename, so the watcher
+    never sees a half-written file.
+    """
+
+    def __init__(
+        self,
+        resolve_paths: Callable[[], dict],
+        load: Callable[[dict, str], Awaitable[ServingModels]],
+        watch_interval: float = 30.0,
+        history_size: int = 10,
+    ):
+        self.resolve_paths = resolve_paths
+        self.load = load
+        self.watch_interval = watch_interval
+        self.history_size = history_size
+        self.current: Optional[ServingModels] = None
+        self.history: List[ServingModels] = []
+        self.last_error: Optional[str] = None
+        self._retiring = set()
+        self._closing = set()
+        self._lock = asyncio.Lock()
+        self._signature = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Load the current model files and start watching them."""
+        await self.reload()
+        if self.watch_interval > 0:
+            self._watcher = asyncio.create_task(self._watch(), name="model-watcher")
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        for models in [self.current, *self._retiring]:
+            if models is not None:
+                await models.close()
+        self._retiring.clear()
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    @asynccontextmanager
+    async def use(self):
+        """Pin the current model version for the duration of a request."""
+        models = self.current
+        if models is None:
+            raise RuntimeError("No model version is loaded")
+        models.active += 1
+        try:
+            yield models
+        finally:
+            models.active -= 1
+            if models in self._retiring and models.active == 0:
+                self._retiring.discard(models)
+                # Unload in the background rather than holding up this request's response
+                task = asyncio.create_task(models.close())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    def _file_signature(self, paths: dict) -> tuple:
+        return tuple(
+            (str(path), os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in paths.values()
+        )
+
+    async def reload(self) -> bool:
+        """Load the model files on disk if they differ from the served version.
+
+        Returns whether a new version was swapped in. If loading fails the
+        current version keeps serving and the error is raised.
+        """
+        async with self._lock:
+            paths = self.resolve_paths()
+            self._signature = self._file_signature(paths)
+            loop = asyncio.get_running_loop()
+            # Model files are large, so hash them off the event loop
+            version = await loop.run_in_executor(None, model_version, list(paths.values()))
+            if self.current is not None and version == self.current.version:
+                return False
+
+            try:
+                models = await self.load(paths, version)
+            except Exception as e:
+                self.last_error = f"Loading model version {version} failed: {str(e)}"
+                raise
+
+            previous, self.current = self.current, models
+            self.last_error = None
+            self.history = [models, *self.history][:self.history_size]
+            logger.info("Serving model version %s", version)
+
+            if previous is not None:
+                previous.retired_at = datetime.utcnow()
+                if previous.active:
+                    self._retiring.add(previous)
+                else:
+                    await previous.close()
+            return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                if self._file_signature(self.resolve_paths()) != self._signature:
+                    await self.reload()
+            except Exception as e:
+                logger.error(f"Model reload failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "current": self.current.info() if self.current else None,
+            "retiring": [models.info() for models in self._retiring],
+            "history": [models.info() for models in self.history],
+            "watch_interval": self.watch_interval,
+            "last_error": self.last_error,
+        }
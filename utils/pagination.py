@@ -0,0 +1,75 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import DateTime, tuple_
+
+from config import settings
+
+
+@dataclass(frozen=True)
+class PageParams:
+    """The ``cursor`` and ``limit`` query parameters of a paginated endpoint, with the decoded cursor."""
+    cursor: Optional[str]
+    limit: int
+    after: Optional[tuple] = None
+
+
+class Keyset:
+    """Keyset pagination over columns that together identify a row, e.g. (created_at, id).
+
+    Each page continues strictly after the last row of the previous one, so
+    with an index on the columns every page costs the same as the first, and
+    rows inserted meanwhile don't shift the pages. The cursor is an opaque
+    base64 encoding of the last row's key.
+    """
+
+    def __init__(self, *columns, descending: bool = True):
+        self.columns = columns
+        self.descending = descending
+
+    def params(
+        self,
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    ) -> PageParams:
+        """Dependency that reads the page parameters; a malformed cursor is a 400."""
+        return PageParams(cursor, limit, self.decode(cursor) if cursor else None)
+
+    def encode(self, values: Sequence) -> str:
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> tuple:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.columns):
+                raise ValueError("wrong number of values")
+            return tuple(
+                datetime.fromisoformat(value) if isinstance(column.type, DateTime) else column.type.python_type(value)
+                for column, value in zip(self.columns, values)
+            )
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    def apply(self, query, page: PageParams):
+        """Order ``query`` by the key and restrict it to the page after the cursor.
+
+        One row more than the page size is fetched, to tell whether there is a next page.
+        """
+        if page.after is not None:
+            key, after = tuple_(*self.columns), tuple_(*page.after)
+            query = query.where(key < after if self.descending else key > after)
+        order = [column.desc() if self.descending else column.asc() for column in self.columns]
+        return query.order_by(*order).limit(page.limit + 1)
+
+    def page(self, rows: List, page: PageParams, key: Callable[[object], tuple]) -> Tuple[List, Optional[str]]:
+        """The rows of the page, and the cursor of the next page (None on the last page)."""
+        if len(rows) <= page.limit:
+            return rows, None
+        rows = rows[:page.limit]
+        return rows, self.encode(key(rows[-1]))
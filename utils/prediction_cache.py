@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import settings
+from models import PredictionCacheEntry
+
+
+@dataclass(frozen=True)
+class CachedPrediction:
+    """Model output for one image."""
+    mri_prob: float
+    predicted_label: Optional[str] = None
+    confidence: Optional[float] = None
+
+    @property
+    def rejected(self) -> bool:
+        return self.predicted_label is None
+
+
+class PredictionCache:
+    """Two-tier prediction cache keyed by image content hash and model version.
+
+    A bounded in-process LRU sits in front of the ``prediction_cache`` table, so
+    entries survive restarts and are shared between workers.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: tuple, prediction: CachedPrediction):
+        self._entries[key] = prediction
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, db: AsyncSession, content_hash: str, model_version: str) -> Optional[CachedPrediction]:
+        key = (content_hash, model_version)
+        prediction = self._entries.get(key)
+        if prediction is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prediction
+
+        result = await db.execute(
+            select(PredictionCacheEntry).where(
+                PredictionCacheEntry.content_hash == content_hash,
+                PredictionCacheEntry.model_version == model_version,
+            )
+        )
+        entry = result.scalar_one_or_none()
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.db_hits += 1
+        prediction = CachedPrediction(entry.mri_prob, entry.predicted_label, entry.confidence)
+        self._remember(key, prediction)
+        return prediction
+
+    async def get_many(self, db: AsyncSession, content_hashes: Iterable[str], model_version: str) -> Dict[str, CachedPrediction]:
+        """Look up several images at once, with a single query for the LRU misses."""
+        found = {}
+        missing = set()
+        for content_hash in content_hashes:
+            key = (content_hash, model_version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[content_hash] = self._entries[key]
+            else:
+                missing.add(content_hash)
+        if not missing:
+            return found
+
+        result = await db.execute(
+            select(PredictionCacheEntry).where(
+                PredictionCacheEntry.content_hash.in_(missing),
+                PredictionCacheEntry.model_version == model_version,
+            )
+        )
+        for entry in result.scalars():
+            prediction = CachedPrediction(entry.mri_prob, entry.predicted_label, entry.confidence)
+            self._remember((entry.content_hash, model_version), prediction)
+            found[entry.content_hash] = prediction
+        self.db_hits += len(missing & found.keys())
+        self.misses += len(missing - found.keys())
+        return found
+
+    async def put(self, db: AsyncSession, content_hash: str, model_version: str, prediction: CachedPrediction):
+        """Store a prediction. The row is written in the caller's transaction."""
+        await self.put_many(db, {content_hash: prediction}, model_version)
+
+    async def put_many(self, db: AsyncSession, predictions: Dict[str, CachedPrediction], model_version: str):
+        """Store several predictions with one INSERT, in the caller's transaction."""
+        if not predictions:
+            return
+        for content_hash, prediction in predictions.items():
+            self._remember((content_hash, model_version), prediction)
+        await db.execute(
+            insert(PredictionCacheEntry)
+            .values([
+                {
+                    "content_hash": content_hash,
+                    "model_version": model_version,
+                    "mri_prob": prediction.mri_prob,
+                    "predicted_label": prediction.predicted_label,
+                    "confidence": prediction.confidence,
+                    "created_at": datetime.utcnow(),
+                }
+                for content_hash, prediction in predictions.items()
+            ])
+            .on_conflict_do_nothing(index_elements=["content_hash", "model_version"])
+        )
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+        }
+
+
+prediction_cache = PredictionCache(settings.PREDICTION_CACHE_SIZE)
@@ -0,0 +1,39 @@
+import io
+from typing import Sequence, Union
+
+import numpy as np
+from PIL import Image
+
+# Input resolution shared by the validator and the tumor classifier
+IMAGE_SIZE = (224, 224)
+
+
+def decode_mri(source: Union[bytes, str, io.IOBase]) -> np.ndarray:
+    """Decode an uploaded image once into a (224, 224, 1) float32 array scaled to [0, 1].
+
+    ``source`` may be the raw upload bytes, the path the upload was streamed to
+    or an open binary file, so no temporary copy on disk is needed to decode it.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        gray = img.convert("L").resize(IMAGE_SIZE)
+    array = np.asarray(gray, dtype=np.float32)
+    array *= 1.0 / 255.0
+    return array[..., np.newaxis]
+
+
+def stack_batch(images: Sequence[np.ndarray]) -> np.ndarray:
+    """Stack decoded images into one (N, 224, 224, 1) float32 batch."""
+    return np.stack(images).astype(np.float32, copy=False)
+
+
+def validator_input(images: np.ndarray, channels: int) -> np.ndarray:
+    """Adapt a grayscale image or batch to the validator's channel count.
+
+    The classifier consumes the grayscale array as is; the grayscale-to-RGB copy
+    is only made when the validator was trained on 3-channel input.
+    """
+    if channels == 3:
+        return np.repeat(images, 3, axis=-1)
+    return images
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import settings
+from models import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, detached from any session so it can be shared between requests."""
+    id: int
+    username: str
+    email: str
+    role: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.username, user.email, user.role)
+
+
+class PrincipalCache:
+    """Bounded LRU of verified access tokens and the users they belong to.
+
+    A hit skips both decoding the token and loading the user. An entry lives
+    until the sooner of ``ttl`` seconds and the token's own expiry. Password
+    resets, role changes and user deletions drop the user's entries with
+    invalidate(); the TTL bounds how long another worker can keep serving the
+    old state.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: float):
+        if self.ttl <= 0:
+            return
+        self._entries[token] = (principal, min(time.time() + self.ttl, token_expires_at))
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Drop every cached token of a user."""
+        for token in [token for token, (principal, _) in self._entries.items() if principal.id == user_id]:
+            del self._entries[token]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
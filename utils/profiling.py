@@ -0,0 +1,166 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Profile ids are uuid4 hex strings; anything else never reaches the filesystem
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# pstats sort keys the summary endpoint accepts
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+class ProfileStore:
+    """Saved request profiles: a pstats dump plus a JSON sidecar with the request details.
+
+    Only the newest ``max_profiles`` are kept. Workers sharing ``directory``
+    share the store, since ids are unique and nothing else is kept in memory.
+    """
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def path(self, profile_id: str, extension: str = ".prof") -> Optional[str]:
+        """Where a profile is stored, or None when the id is malformed or unknown."""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}{extension}")
+        return path if os.path.exists(path) else None
+
+    def save(self, profile_id: str, profiler: cProfile.Profile, info: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        # Written last, so a profile is only listed once its dump is complete
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump({"id": profile_id, **info}, f)
+        self.prune()
+
+    def list(self) -> List[dict]:
+        """Saved profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # Pruned by another worker in between, or still being written
+                continue
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    def summary(self, profile_id: str, sort: str = "cumulative", limit: int = 40) -> Optional[str]:
+        """The top functions of a profile as pstats prints them."""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def delete(self, profile_id: str):
+        for extension in (".json", ".prof"):
+            path = self.path(profile_id, extension)
+            if path is not None:
+                os.remove(path)
+
+    def prune(self):
+        for profile in self.list()[self.max_profiles:]:
+            self.delete(profile["id"])
+
+
+class ProfilingMiddleware:
+    """Profiles single requests with cProfile and saves them to a ProfileStore.
+
+    A request is profiled when it carries ``header`` set to ``token`` (the
+    header is ignored while no token is configured), or at random with
+    probability ``sample_rate``. Only one request is profiled at a time; others
+    arriving meanwhile run unprofiled. The profiled request gets an
+    ``X-Profile-Id`` response header naming its profile.
+
+    cProfile follows the event loop thread, so coroutines of concurrent
+    requests that run while the profiled one awaits show up in its profile too,
+    while work handed to executor threads or processes (bcrypt, inference)
+    shows up only as the time spent awaiting it.
+    """
+
+    def __init__(self, app, store: ProfileStore, token: str = "", sample_rate: float = 0.0, header: str = "x-profile"):
+        self.app = app
+        self.store = store
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode()
+        self._active = False
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == self.header and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profile_id = uuid.uuid4().hex
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        created_at = datetime.utcnow()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            self._active = False
+            info = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(scope.get("route"), "path", None),
+                "status": status,
+                "duration_ms": duration * 1000.0,
+                "trigger": trigger,
+                "created_at": created_at.isoformat(),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, profiler, info)
+            except Exception as e:
+                logger.error(f"Could not save profile of {scope['method']} {scope['path']}: {str(e)}")
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
@@ -1,6 +1,9 @@
 def success_response(data: dict, message: str):
     return {"data": data, "message": message, "status": "success"}
 
+def page_response(data: list, next_cursor, message: str):
+    return {**success_response(data, message), "next_cursor": next_cursor}
+
 def error_response(message: str):
     return {"message": message, "status": "error"}
 
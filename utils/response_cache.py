@@ -0,0 +1,131 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from config import settings
+
+
+class CachedResponse:
+    """A serialized JSON body with its ETag and expiry time."""
+
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class ResponseCache:
+    """In-process cache of serialized JSON responses for endpoints that dashboards poll.
+
+    Keys are tuples whose first element names the endpoint, e.g.
+    ``("prediction-history", user_id)``. Each entry expires after the TTL
+    given when it was stored, and the least recently used entries are evicted
+    once the cache holds more than ``max_entries`` entries or ``max_bytes`` of
+    bodies. Writes drop the affected entries with invalidate() after they
+    commit; the TTL bounds how stale a worker can be after a write made by
+    another worker.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Bumped by every invalidation, so a response built from data read before a write isn't stored after it
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, body: bytes, ttl: float, generation: int) -> CachedResponse:
+        entry = CachedResponse(body, etag_for(body), time.monotonic() + ttl)
+        if generation != self._generation or ttl <= 0 or len(body) > self.max_bytes:
+            return entry
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+        return entry
+
+    def _drop(self, key: tuple):
+        self._bytes -= len(self._entries.pop(key).body)
+
+    def invalidate(self, *prefixes: tuple):
+        """Drop every entry whose key starts with one of the given prefixes."""
+        self._generation += 1
+        self.invalidations += 1
+        for key in [key for key in self._entries if any(key[:len(prefix)] == prefix for prefix in prefixes)]:
+            self._drop(key)
+
+    def invalidate_results(self, *user_ids: int):
+        """Drop the responses that change when classification results of these users are written."""
+        self.invalidate(("analytics",), ("history",), *(("prediction-history", user_id) for user_id in user_ids))
+
+    async def respond(self, request: Request, key: tuple, ttl: float, build: Callable[[], Awaitable[dict]]) -> Response:
+        """Serve ``key`` from the cache, or build, serialize and cache it.
+
+        Answers 304 with no body when the client's If-None-Match matches the
+        ETag of the current response.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            generation = self._generation
+            body = JSONResponse(jsonable_encoder(await build())).body
+            entry = self.put(key, body, ttl, generation)
+
+        # no-cache lets clients keep the body but makes them revalidate it on every poll
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from sqlalchemy import exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import ClassificationJob, JobStatus, MRIImage
+from utils import metrics
+
+# Bytes read from the upload per iteration
+CHUNK_SIZE = 64 * 1024
+
+# Bytes needed to sniff every supported type (DICOM's magic sits at offset 128)
+SNIFF_SIZE = 132
+
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Extension each sniffed type is stored under, and the names it may be allowed as
+FILE_TYPES = {
+    "png": (".png", {"png"}),
+    "jpeg": (".jpg", {"jpg", "jpeg"}),
+    "dicom": (".dcm", {"dcm", "dicom"}),
+}
+
+# Type named by each extension alias
+EXTENSION_TYPES = {alias: file_type for file_type, (_, aliases) in FILE_TYPES.items() for alias in aliases}
+
+# Types decode_mri can read; DICOM is only sniffed so it can be turned away before it is stored
+DECODABLE_TYPES = {"png", "jpeg"}
+
+
+@dataclass
+class StoredUpload:
+    """An upload saved under its content-addressed path."""
+    content_hash: str
+    path: str
+    file_type: str
+    size: int
+    created: bool  # False when an identical file was already stored
+
+
+def content_path(upload_dir: str, content_hash: str, extension: str = "") -> str:
+    """Content-addressed location of a file, fanned out by the first two hash characters."""
+    return os.path.join(upload_dir, content_hash[:2], f"{content_hash}{extension}")
+
+
+def sniff_file_type(header: bytes) -> Optional[str]:
+    """Identify an image from its magic bytes rather than its client-supplied name."""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header[128:132] == b"DICM":
+        return "dicom"
+    return None
+
+
+def check_file_type(header: bytes, filename: str, allowed_extensions: Iterable[str]) -> str:
+    """Sniff the upload's type and make sure it is allowed, decodable and named by the filename extension.
+
+    Extensions are compared by the type they name, so allowing "jpg" also
+    allows ".jpeg", and a file's extension must name the type it was sniffed as.
+    """
+    allowed_types = {file_type for extension in allowed_extensions if (file_type := EXTENSION_TYPES.get(extension.lower()))}
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    if extension and EXTENSION_TYPES.get(extension) not in allowed_types:
+        raise HTTPException(status_code=415, detail=f"File extension '.{extension}' is not allowed")
+
+    file_type = sniff_file_type(header)
+    if file_type not in allowed_types:
+        raise HTTPException(status_code=415, detail="Unsupported file type. Please upload a PNG or JPEG image.")
+    if file_type not in DECODABLE_TYPES:
+        raise HTTPException(status_code=415, detail=f"{file_type.upper()} images cannot be classified yet. Please export the scan as a PNG or JPEG image.")
+    if extension and EXTENSION_TYPES[extension] != file_type:
+        raise HTTPException(status_code=415, detail=f"File extension '.{extension}' does not match its {file_type.upper()} content")
+    return file_type
+
+
+async def store_upload(
+    file: UploadFile,
+    upload_dir: str,
+    max_bytes: int,
+    allowed_extensions: Iterable[str],
+) -> StoredUpload:
+    """Stream an upload to storage in fixed-size chunks and store it once by content hash.
+
+    The type is sniffed from the first bytes, the size limit is enforced as data
+    arrives and the file is hashed while it is copied, so at most one chunk of
+    the upload is held in memory at a time. Identical uploads map to the same
+    path, so a repeat upload is not stored twice and client-supplied filenames
+    can no longer collide.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    # Written under a unique name and linked into place, so readers never see a partial file
+    temp_path = os.path.join(upload_dir, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+    file_type = None
+    read_seconds = write_seconds = 0.0
+    try:
+        with open(temp_path, "wb") as f:
+            while True:
+                started = time.perf_counter()
+                chunk = await file.read(CHUNK_SIZE)
+                read_seconds += time.perf_counter() - started
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB.",
+                    )
+                if file_type is None:
+                    # Reject as soon as the header is known, before the rest is copied
+                    header += chunk[:SNIFF_SIZE - len(header)]
+                    if len(header) >= SNIFF_SIZE or sniff_file_type(header):
+                        file_type = check_file_type(header, file.filename, allowed_extensions)
+                digest.update(chunk)
+                started = time.perf_counter()
+                f.write(chunk)
+                write_seconds += time.perf_counter() - started
+
+        if file_type is None:
+            # Upload shorter than SNIFF_SIZE that matched nothing
+            file_type = check_file_type(header, file.filename, allowed_extensions)
+
+        content_hash = digest.hexdigest()
+        path = content_path(upload_dir, content_hash, FILE_TYPES[file_type][0])
+        started = time.perf_counter()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Claimed atomically: of concurrent identical uploads exactly one creates the
+        # file, so only that one may remove it again
+        try:
+            os.link(temp_path, path)
+            created = True
+        except FileExistsError:
+            created = False
+        write_seconds += time.perf_counter() - started
+        metrics.observe_stage("upload_read", read_seconds)
+        metrics.observe_stage("disk_write", write_seconds)
+        return StoredUpload(content_hash=content_hash, path=path, file_type=file_type, size=size, created=created)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+async def discard_upload(db: AsyncSession, upload: StoredUpload):
+    """Remove a stored upload that this request created, unless something now refers to it.
+
+    A concurrent upload of the same scan shares the file without having
+    created it, and may already have saved an image or queued a job pointing
+    at it.
+    """
+    if upload.created:
+        await discard_stored_file(db, upload.content_hash, upload.path)
+
+
+async def discard_stored_file(db: AsyncSession, content_hash: str, path: str):
+    """Remove a stored file unless a saved MRI image or a pending job refers to its content."""
+    referenced = await db.scalar(select(or_(
+        exists().where(MRIImage.content_hash == content_hash),
+        exists().where(
+            ClassificationJob.content_hash == content_hash,
+            ClassificationJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]),
+        ),
+    )))
+    if not referenced and os.path.exists(path):
+        os.remove(path)
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects uploads whose declared Content-Length is over the limit before the body is read.
+
+    ``limits`` maps request paths to the maximum body size in bytes. Bodies sent
+    without a Content-Length are spooled to disk by the multipart parser and
+    still checked chunk by chunk in store_upload().
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.limits:
+            limit = self.limits[scope["path"]]
+            for name, value in scope["headers"]:
+                if name == b"content-length" and value.isdigit() and int(value) > limit:
+                    response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import tensorflow as tf
+
+from utils.inference_engine import BatchedEngine
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("float16", "int8")
+
+
+def tflite_path(model_dir: str, name: str, quantization: str) -> str:
+    """Where the converted model for ``name`` ("validator" or "classifier") is stored."""
+    return os.path.join(model_dir, f"{name}.{quantization}.tflite")
+
+
+def convert_model(model, quantization: str, representative_images: Optional[Callable[[], Iterable[np.ndarray]]] = None) -> bytes:
+    """Convert a Keras model to a quantized TFLite flatbuffer.
+
+    "float16" stores the weights as float16. "int8" quantizes weights and
+    activations to int8 using ``representative_images`` (single images of the
+    model's input shape) for calibration; inputs and outputs stay float32.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        if representative_images is None:
+            raise ValueError("int8 quantization needs representative images for calibration")
+        converter.representative_dataset = lambda: ([image[np.newaxis].astype(np.float32)] for image in representative_images())
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+
+class TFLiteEngine(BatchedEngine):
+    """Serves a TFLite model with the same interface as InferenceEngine.
+
+    TFLite interpreters are not thread-safe, so each executor thread gets its
+    own interpreters, one per warmed batch size, each allocated once; the
+    executor warms them in every thread through warmup_thread().
+    """
+
+    backend = "TFLite"
+
+    def __init__(self, path: str, name: str, batch_sizes: Iterable[int] = (1,), num_threads: Optional[int] = None):
+        self.path = path
+        self.name = name
+        self.batch_sizes = sorted(set(batch_sizes))
+        self.num_threads = num_threads
+        with open(path, "rb") as f:
+            self._model_content = f.read()
+        self._local = threading.local()
+        details = self._interpreter(1).get_input_details()[0]
+        self.input_shape = (None, *details["shape"][1:].tolist())
+
+    def _interpreter(self, batch_size: int):
+        interpreters = getattr(self._local, "interpreters", None)
+        if interpreters is None:
+            interpreters = self._local.interpreters = {}
+        interpreter = interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = tf.lite.Interpreter(model_content=self._model_content, num_threads=self.num_threads)
+            input_index = interpreter.get_input_details()[0]["index"]
+            shape = interpreter.get_input_details()[0]["shape"].copy()
+            shape[0] = batch_size
+            interpreter.resize_tensor_input(input_index, shape)
+            interpreter.allocate_tensors()
+            interpreters[batch_size] = interpreter
+        return interpreter
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        interpreter = self._interpreter(len(batch))
+        interpreter.set_tensor(interpreter.get_input_details()[0]["index"], batch)
+        interpreter.invoke()
+        # The output buffer is reused by the interpreter's next run
+        return interpreter.get_tensor(interpreter.get_output_details()[0]["index"]).copy()
+
+    def warmup_thread(self):
+        self.warmup()